@@ -0,0 +1,134 @@
+import asyncio
+import json
+import math
+from collections import deque
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; `status` is the HTTP status to answer with."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class AdmissionLimiter:
+    """Caps concurrent requests, with a bounded FIFO queue for the overflow.
+
+    At most `max_active` requests run at once. Up to `max_queued` more wait
+    in arrival order. A request that finds the queue full is shed at once
+    with 429. One that waits longer than `queue_timeout` seconds is shed
+    with 503, so queueing delay stays bounded instead of growing with the
+    burst. A finishing request hands its slot straight to the oldest
+    waiter.
+    """
+
+    def __init__(self, max_active, max_queued, queue_timeout):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queued:
+            self.shed_queue_full += 1
+            raise Overloaded(429)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as error:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(error, asyncio.TimeoutError):
+                self.shed_timeout += 1
+                raise Overloaded(503) from None
+            raise
+        self.admitted += 1
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "maxActive": self.max_active,
+            "maxQueued": self.max_queued,
+            "admitted": self.admitted,
+            "shedQueueFull": self.shed_queue_full,
+            "shedTimeout": self.shed_timeout,
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits HTTP requests through separate read and write limiters.
+
+    GET, HEAD and OPTIONS count as reads and everything else as writes, so
+    a burst of one kind cannot starve the other. Requests to `read_paths`
+    count as reads whatever their method, for read-only POST endpoints
+    that take their input in the body. Paths in `exempt_paths` bypass
+    admission. Use it for health checks and for long-lived streams
+    that would otherwise hold a slot for their whole life. Shed requests
+    get a JSON error with Retry-After.
+    """
+
+    def __init__(self, app, reads, writes, read_paths=(), exempt_paths=()):
+        self.app = app
+        self.reads = reads
+        self.writes = writes
+        self.read_paths = frozenset(read_paths)
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        is_read = scope["method"] in READ_METHODS or scope["path"] in self.read_paths
+        limiter = self.reads if is_read else self.writes
+        try:
+            await limiter.acquire()
+        except Overloaded as overloaded:
+            await self._shed(send, overloaded.status, limiter)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+    async def _shed(self, send, status, limiter):
+        detail = "Too many queued requests" if status == 429 else "Timed out waiting for capacity"
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(limiter.queue_timeout))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
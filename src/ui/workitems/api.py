@@ -1,12 +1,60 @@
-from fastapi import FastAPI, HTTPException
-import pandas as pd
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import csv
 import uvicorn
+import asyncio
+import base64
+import io
+import json
+import threading
+import time
+from admission import AdmissionLimiter, AdmissionMiddleware
+from cache import ResponseCache
+from checkpoint import CsvCheckpointer
+from compression import compress, negotiate
+from contextlib import asynccontextmanager, suppress
+from feed import ChangeFeed, change_frame, resync_frame
+from idempotency import IdempotencyCache, IdempotencyConflict, SqliteIdempotencyCache
+from importer import CsvChunker, parse_rows
+from itertools import islice
+from journal import JournalError, NullJournal, WorkItemJournal, delete_record, put_record
+from search import SearchIndex
+from serialization import dumps, record_json, records_json
+from sqlite_store import SqliteWorkItemStore
+from store import VersionConflict, WorkItemRecord, WorkItemStore
 
 
+@asynccontextmanager
+async def lifespan(app):
+    follower = asyncio.create_task(follow_changes()) if STORAGE == "sqlite" else None
+    checkpointing = asyncio.create_task(checkpointer.run()) if CHECKPOINT_INTERVAL > 0 else None
+    start_search_index()
+    yield
+    # Wait for both to stop, so the last checkpoint can't overlap one still running
+    for task in (follower, checkpointing):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    if checkpointing is not None:
+        await checkpointer.checkpoint()
+    await journal.close()
+    workitems.close()
+
+async def follow_changes():
+    """Feeds writes from other workers sharing the database to the local listeners."""
+    while True:
+        await asyncio.sleep(SYNC_INTERVAL)
+        try:
+            workitems.sync()
+        except Exception as error:
+            print(f"Work item sync failed, retrying next interval: {error!r}")
+
 app = FastAPI(
     title="Work Items API",
     description="API with CRUD operations for workitems data",
@@ -14,6 +62,7 @@ app = FastAPI(
     servers=[
         {"url": "http://localhost:8000", "description": "Local development server"},
     ],
+    lifespan=lifespan,
 )
 class WorkItemsDTO(BaseModel):
     ID: int
@@ -23,34 +72,318 @@ class WorkItemsDTO(BaseModel):
     State: str
     Tags: str
 
-# Load CSV data into a DataFrame
-data = pd.read_csv("data/workitems.csv")
+class WorkItemFieldsDTO(BaseModel):
+    """A work item projected with `fields=`: only the requested fields are present."""
+    ID: int | None = None
+    WorkItemType: str | None = None
+    Title: str | None = None
+    AssignedTo: str | None = None
+    State: str | None = None
+    Tags: str | None = None
+
+class NewWorkItemDTO(WorkItemsDTO):
+    # Omit the ID to have the server allocate one
+    ID: int | None = None
+
+class BatchResultDTO(BaseModel):
+    ID: int
+    status: int
+    detail: str | None = None
+
+class WorkItemLookupDTO(BatchResultDTO):
+    item: WorkItemsDTO | WorkItemFieldsDTO | None = None
+
+class WorkItemChangeDTO(BaseModel):
+    version: int
+    op: str
+    ID: int
+    item: WorkItemsDTO | None = None
+
+class WorkItemChangesDTO(BaseModel):
+    version: int
+    epoch: str
+    changes: list[WorkItemChangeDTO]
+
+class WorkItemCountDTO(BaseModel):
+    WorkItemType: str
+    State: str
+    AssignedTo: str
+    count: int
+
+class WorkItemStatsDTO(BaseModel):
+    total: int
+    byState: dict[str, int]
+    byType: dict[str, int]
+    byAssignedTo: dict[str, int]
+    breakdown: list[WorkItemCountDTO]
+
+class AdmissionStatsDTO(BaseModel):
+    active: int
+    queued: int
+    maxActive: int
+    maxQueued: int
+    admitted: int
+    shedQueueFull: int
+    shedTimeout: int
+
+class HealthDTO(BaseModel):
+    status: str
+    reads: AdmissionStatsDTO
+    writes: AdmissionStatsDTO
+
+class ImportErrorDTO(BaseModel):
+    row: int
+    detail: str
+
+class ImportResultDTO(BaseModel):
+    created: int
+    failed: int
+    errors: list[ImportErrorDTO]
+    errorsTruncated: bool
+
+CSV_COLUMNS = list(WorkItemsDTO.model_fields)
+
+def new_record(work_item):
+    fields = work_item.model_dump()
+    if fields["ID"] is None:
+        fields["ID"] = workitems.allocate_id()
+    return WorkItemRecord.create(**fields)
+
+async def run_store(function, *args):
+    """Runs a store write, in a worker thread for SQLite.
+
+    SQLite writes can wait up to busy_timeout for another worker's lock and
+    then fsync, which must not stall this worker's event loop. In-memory
+    writes finish at once and stay on the loop.
+    """
+    if STORAGE == "sqlite":
+        return await asyncio.to_thread(function, *args)
+    return function(*args)
+
+async def run_idempotent(key, fingerprint, write, persist):
+    """Runs a create at most once per Idempotency-Key; returns (status, body, headers).
+
+    `write` makes the store changes and returns (result, (status, body,
+    headers)); `persist` journals the result. A retry with the same key
+    and request gets the first response back, marked Idempotent-Replayed.
+    """
+    if key is None:
+        written, response = await run_store(write)
+        await persist(written)
+        return response
+    try:
+        status, body, headers, replayed = await idempotency_cache.run(key, fingerprint, write, persist)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    if replayed:
+        headers = {**headers, "Idempotent-Replayed": "true"}
+    return status, body, headers
+
+def to_dto(record):
+    return WorkItemsDTO.model_construct(**record._asdict())
 
-workitems = []
-workItemTypes = set()
-workItemStates = set()
+def json_response(body, headers=None, status_code=200):
+    """Wraps pre-serialized JSON bytes; response_model still documents the schema."""
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+DATA_PATH = os.getenv("WORKITEMS_DATA_PATH", "data/workitems.csv")
+# "memory" keeps items in process with the journal for durability; "sqlite"
+# shares one WAL-mode database file between worker processes
+STORAGE = os.getenv("WORKITEMS_STORAGE", "memory")
+SQLITE_PATH = os.getenv("WORKITEMS_SQLITE_PATH", "data/workitems.db")
+SYNC_INTERVAL = float(os.getenv("WORKITEMS_SYNC_INTERVAL", "0.2"))
+JOURNAL_PATH = os.getenv("WORKITEMS_JOURNAL_PATH", "data/workitems.journal")
+SNAPSHOT_PATH = os.getenv("WORKITEMS_SNAPSHOT_PATH", "data/workitems.snapshot.csv")
+COMPACT_EVERY = int(os.getenv("WORKITEMS_COMPACT_EVERY", "10000"))
+# Admission control: concurrent requests allowed and queued per kind, and
+# how long a queued request may wait before it is shed with 503
+MAX_ACTIVE_READS = int(os.getenv("WORKITEMS_MAX_ACTIVE_READS", "64"))
+MAX_QUEUED_READS = int(os.getenv("WORKITEMS_MAX_QUEUED_READS", "256"))
+MAX_ACTIVE_WRITES = int(os.getenv("WORKITEMS_MAX_ACTIVE_WRITES", "16"))
+MAX_QUEUED_WRITES = int(os.getenv("WORKITEMS_MAX_QUEUED_WRITES", "64"))
+QUEUE_TIMEOUT = float(os.getenv("WORKITEMS_QUEUE_TIMEOUT", "2.0"))
+# Seconds between rewrites of DATA_PATH with the live items; 0 disables them
+CHECKPOINT_INTERVAL = float(os.getenv("WORKITEMS_CHECKPOINT_INTERVAL", "30"))
+IDEMPOTENCY_TTL = float(os.getenv("WORKITEMS_IDEMPOTENCY_TTL", str(24 * 60 * 60)))
+
+if STORAGE == "sqlite":
+    workitems = SqliteWorkItemStore(SQLITE_PATH)
+else:
+    workitems = WorkItemStore()
+change_feed = ChangeFeed(epoch=workitems.version_epoch)
+if STORAGE == "sqlite":
+    idempotency_cache = SqliteIdempotencyCache(workitems, ttl_seconds=IDEMPOTENCY_TTL)
+else:
+    idempotency_cache = IdempotencyCache(ttl_seconds=IDEMPOTENCY_TTL)
+# Built in a worker thread after startup; None until it is ready
+search_index = None
+search_building = None
+# IDs written while an index is being built, reindexed before it goes live
+search_backlog = None
+search_lock = threading.Lock()
+
+def search_text(item):
+    return f"{item.Title} {item.Tags}"
+
+def index_for_search(version, id, item):
+    with search_lock:
+        if search_backlog is not None:
+            search_backlog.add(id)
+        if search_index is None:
+            return
+        if item is None:
+            search_index.remove(id)
+        else:
+            search_index.add(id, search_text(item))
+
+def build_search_index():
+    """Indexes a store snapshot, then catches up with the writes made meanwhile and goes live."""
+    global search_index, search_backlog
+    started = time.perf_counter()
+    with search_lock:
+        search_backlog = set()
+    index = SearchIndex()
+    for item in workitems.snapshot():
+        index.add(item.ID, search_text(item))
+    with search_lock:
+        for id in search_backlog:
+            item = workitems.get(id)
+            if item is None:
+                index.remove(id)
+            else:
+                index.add(id, search_text(item))
+        search_backlog = None
+        search_index = index
+    print(f"Indexed {len(index)} work items for search in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+def start_search_index(rebuild=False):
+    """Starts building the search index in a worker thread; returns the task.
+
+    A build already under way is reused unless `rebuild` is set, in which
+    case a new one follows it so the result reflects the store as of now.
+    The live index keeps answering until its replacement has caught up.
+    """
+    global search_building
+    previous = search_building
+    if previous is not None and not previous.done() and not rebuild:
+        return previous
+
+    async def build():
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+        await asyncio.to_thread(build_search_index)
+
+    search_building = asyncio.ensure_future(build())
+    return search_building
 
 def load_work_items_from_csv(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, mode='r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                print(row)
-                work_item = WorkItemsDTO(
-                    ID=int(row['ID']),
-                    WorkItemType=row['WorkItemType'],
-                    Title=row['Title'],
-                    AssignedTo=row['AssignedTo'],
-                    State=row['State'],
-                    Tags=row['Tags']
-                )
-                workitems.append(work_item)
-                workItemTypes.add(work_item.WorkItemType)
-                workItemStates.add(work_item.State)
-
-load_work_items_from_csv('data/workitems.csv')
+    """Loads work items from a CSV file in a single pass.
+
+    Rows come from our own data files, so they are stored as records
+    directly instead of running DTO validation per row.
+    """
+    if not os.path.exists(file_path):
+        return 0
+    with open(file_path, mode='r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return 0
+        positions = [header.index(column) for column in CSV_COLUMNS]
+        count = 0
+        for row in reader:
+            id, work_item_type, title, assigned_to, state, tags = (row[i] for i in positions)
+            workitems.add(WorkItemRecord.create(int(id), work_item_type, title, assigned_to, state, tags))
+            count += 1
+    return count
+
+def apply_journal_record(record):
+    if record["op"] == "delete":
+        workitems.delete(record["id"])
+        return
+    work_item = WorkItemRecord.create(**record["item"])
+    if work_item.ID in workitems:
+        workitems.update(work_item.ID, work_item._asdict())
+    else:
+        workitems.add(work_item)
+
+def restore(id, item):
+    """Puts an item back as it was before a write; None means it did not exist."""
+    if item is None:
+        workitems.delete(id)
+    elif id in workitems:
+        workitems.update(id, item._asdict())
+    else:
+        workitems.add(item)
+
+def undoing(previous):
+    """Returns the undo for a journal append from (id, item before the write) pairs."""
+    def undo():
+        for id, item in reversed(previous):
+            restore(id, item)
+    return undo
 
+def snapshot_rows():
+    return workitems.snapshot()
 
+load_started = time.perf_counter()
+if STORAGE == "sqlite":
+    # The database is durable on its own; only seed it from the CSV once
+    journal = NullJournal()
+    load_path = SQLITE_PATH
+    with workitems.bulk():
+        loaded = load_work_items_from_csv(DATA_PATH) if workitems.version == 0 else len(workitems)
+    replayed = 0
+else:
+    # Startup replays the latest snapshot (or the seed CSV) plus the journal
+    journal = WorkItemJournal(JOURNAL_PATH, SNAPSHOT_PATH, CSV_COLUMNS, snapshot_rows, COMPACT_EVERY)
+    load_path = SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else DATA_PATH
+    with workitems.bulk():
+        loaded = load_work_items_from_csv(load_path)
+    replayed = 0
+    for record in journal.replay():
+        apply_journal_record(record)
+        replayed += 1
+workitems.listeners.extend([change_feed.publish, index_for_search])
+workitems.resets.extend([change_feed.resync, lambda: start_search_index(rebuild=True)])
+if STORAGE == "sqlite":
+    # Workers share the database, so the one holding the lease writes the
+    # file for all of them, starting from what the database holds now
+    checkpointer = CsvCheckpointer(
+        DATA_PATH,
+        CSV_COLUMNS,
+        workitems,
+        CHECKPOINT_INTERVAL,
+        written_version=workitems.version,
+        leader=lambda: workitems.acquire_lease("checkpoint", str(os.getpid()), 3 * CHECKPOINT_INTERVAL),
+    )
+else:
+    # The seed file already holds what was just loaded from it
+    checkpointer = CsvCheckpointer(
+        DATA_PATH,
+        CSV_COLUMNS,
+        workitems,
+        CHECKPOINT_INTERVAL,
+        durable=lambda: journal.durable,
+        written_version=workitems.version if load_path == DATA_PATH and not replayed else None,
+    )
+print(
+    f"Loaded {loaded} work items from {load_path} and replayed {replayed} journal records "
+    f"in {(time.perf_counter() - load_started) * 1000:.1f} ms"
+)
+
+
+read_admission = AdmissionLimiter(MAX_ACTIVE_READS, MAX_QUEUED_READS, QUEUE_TIMEOUT)
+write_admission = AdmissionLimiter(MAX_ACTIVE_WRITES, MAX_QUEUED_WRITES, QUEUE_TIMEOUT)
+
+# Added before CORS so CORS stays outermost and shed responses carry its headers
+app.add_middleware(
+    AdmissionMiddleware,
+    reads=read_admission,
+    writes=write_admission,
+    read_paths=("/workitems:lookup",),
+    exempt_paths=("/health", "/workitems/events"),
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -59,59 +392,485 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.get("/workitems", response_model=list[WorkItemsDTO])
-async def get_all_work_items():
-    return workitems
+response_cache = ResponseCache()
+
+@app.exception_handler(JournalError)
+async def journal_failed(request, error):
+    print(f"Work item write rejected: {error}")
+    return JSONResponse(
+        {"detail": "The change could not be saved and was not applied; retry later"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(RequestValidationError)
+async def validation_failed(request, error):
+    """Answers a missing If-Match with 428 rather than the generic 422."""
+    if any(detail["type"] == "missing" and tuple(detail["loc"]) == ("header", "If-Match") for detail in error.errors()):
+        return JSONResponse({"detail": IF_MATCH_REQUIRED}, status_code=428)
+    return await request_validation_exception_handler(request, error)
+
+def compressed_json_response(request, body, headers=None, encoding=None):
+    """Sends JSON bytes in the content coding the client prefers.
+
+    Pass `encoding` when the body is already encoded, as cached bodies are.
+    """
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if encoding is None:
+        body, encoding = compress(body, negotiate(request.headers.get("accept-encoding")))
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return json_response(body, headers)
+
+def version_tag(version):
+    epoch = workitems.version_epoch
+    return f"{epoch}-{version}" if epoch else str(version)
+
+def etag_matches(header, etag):
+    """Checks an If-None-Match or If-Match header value against an ETag."""
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+def cached_json_response(request, key, build):
+    """Serves JSON bytes cached per data version, honouring If-None-Match.
+
+    Each negotiated content coding is also cached, so a listing is
+    serialized and compressed once per version however often it is read.
+    """
+    version = workitems.version
+    etag = f'W/"{version_tag(version)}"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    body = response_cache.get_or_build(key, version, build)
+    body, encoding = response_cache.get_or_build(
+        (*key, encoding), version, lambda: compress(body, encoding)
+    )
+    return compressed_json_response(request, body, {"ETag": etag}, encoding)
+
+def encode_cursor(seq):
+    return base64.urlsafe_b64encode(str(seq).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields):
+    """Turns a `fields` query value into a tuple of column names, or None for every column."""
+    if fields is None:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in CSV_COLUMNS]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields given")
+    return names
+
+@app.get("/health", response_model=HealthDTO)
+async def get_health():
+    """Bypasses admission control, so it answers under overload and reports queue depth and shed counts."""
+    return {"status": "ok", "reads": read_admission.stats(), "writes": write_admission.stats()}
+
+@app.get("/workitems", response_model=list[WorkItemsDTO] | list[WorkItemFieldsDTO])
+async def get_all_work_items(
+    request: Request,
+    state: str | None = None,
+    work_item_type: str | None = Query(None, alias="type"),
+    assignedTo: str | None = None,
+    tag: list[str] | None = Query(None),
+    tagMatch: str = Query("all", pattern="^(all|any)$"),
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    fields: str | None = Query(None, description="Comma-separated fields to return, e.g. ID,Title,State"),
+):
+    criteria = dict(State=state, WorkItemType=work_item_type, AssignedTo=assignedTo)
+    criteria.update(tags=tuple(tag or ()), any_tags=tagMatch == "any")
+    fields = parse_fields(fields)
+    if limit is None and cursor is None:
+        return cached_json_response(
+            request,
+            ("workitems", *criteria.values(), fields),
+            lambda: records_json(workitems.filter(**criteria), fields),
+        )
+    after = decode_cursor(cursor) if cursor else -1
+    limit = limit or 100
+    page = list(islice(workitems.scan(after=after, **criteria), limit + 1))
+    headers = {}
+    if len(page) > limit:
+        next_cursor = encode_cursor(page[limit - 1][0])
+        next_url = request.url.include_query_params(cursor=next_cursor, limit=limit)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+        headers["X-Next-Cursor"] = next_cursor
+    return compressed_json_response(request, records_json((item for _, item in page[:limit]), fields), headers)
+
+EXPORT_CHUNK_SIZE = 1000
+
+async def snapshot_chunks():
+    """Yields a store snapshot EXPORT_CHUNK_SIZE records at a time, each read in a worker thread."""
+    items = iter(workitems.snapshot())
+    while chunk := await asyncio.to_thread(list, islice(items, EXPORT_CHUNK_SIZE)):
+        yield chunk
+
+async def export_ndjson():
+    async for chunk in snapshot_chunks():
+        yield b"\n".join(map(record_json, chunk)) + b"\n"
+
+async def export_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    async for chunk in snapshot_chunks():
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+@app.get("/workitems/export")
+async def export_work_items(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    if format == "csv":
+        return StreamingResponse(
+            export_csv(),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="workitems.csv"'},
+        )
+    return StreamingResponse(export_ndjson(), media_type="application/x-ndjson")
+
+IMPORT_MAX_ERRORS = 1000
+
+@app.post(
+    "/workitems/import",
+    response_model=ImportResultDTO,
+    openapi_extra={"requestBody": {"required": True, "content": {"text/csv": {"schema": {"type": "string"}}}}},
+)
+async def import_work_items(request: Request):
+    """Creates work items from a CSV upload with the same columns as the export.
+
+    The body is read and committed batch by batch, so memory stays bounded
+    however large the upload is, and cutting and parsing batches runs in a
+    worker thread. Rows with a blank ID get one allocated. Rows that fail
+    are reported by their 1-based position after the header and do not
+    stop the import; a row that never ends, such as one with an unmatched
+    quote, stops it with a 422 after the batches before it.
+    """
+    chunker = CsvChunker()
+    positions, next_row = None, 1
+    created, errors, failed = 0, [], 0
+
+    def commit_rows(rows):
+        nonlocal failed
+        records = []
+        with workitems.bulk():
+            for row, fields, error in rows:
+                if error is None:
+                    try:
+                        id = fields[0] if fields[0] is not None else workitems.allocate_id()
+                        records.append(workitems.add(WorkItemRecord.create(id, *fields[1:])))
+                        continue
+                    except KeyError:
+                        error = f"Work item {id} already exists"
+                failed += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append(ImportErrorDTO(row=row, detail=error))
+        return records
+
+    def parse(take):
+        text = take()
+        return (positions, []) if text is None else parse_rows(text, CSV_COLUMNS, positions, next_row)
+
+    async def apply(take):
+        nonlocal positions, next_row, created, failed
+        try:
+            positions, rows = await asyncio.to_thread(parse, take)
+        except (ValueError, csv.Error) as error:
+            # A bad header or a row that never ends; rows are otherwise reported one by one
+            raise HTTPException(status_code=422, detail=str(error))
+        if not rows:
+            return
+        records = await run_store(commit_rows, rows)
+        next_row = rows[-1][0] + 1
+        created += len(records)
+        await journal.append(
+            *(put_record(item) for item in records), undo=undoing([(item.ID, None) for item in records])
+        )
+
+    async for chunk in request.stream():
+        if chunker.feed(chunk):
+            await apply(chunker.take)
+    await apply(chunker.finish)
+    return ImportResultDTO(created=created, failed=failed, errors=errors, errorsTruncated=failed > len(errors))
+
+def is_current_version(epoch, version):
+    """Tells whether a version a client remembers belongs to this store's current numbering."""
+    return epoch == workitems.version_epoch and version <= workitems.version
+
+@app.get("/workitems/changes", response_model=WorkItemChangesDTO)
+async def get_work_item_changes(
+    since: int = Query(0, ge=0),
+    epoch: str = Query("", description="The epoch returned along with the `since` version"),
+):
+    """Changes after `since`; 410 when it predates the change log or another epoch, so resync from /workitems."""
+    if since and not is_current_version(epoch, since):
+        raise HTTPException(status_code=410, detail="Version was not issued in the current epoch, resync from /workitems")
+    changes = workitems.changes_since(since)
+    if changes is None:
+        raise HTTPException(status_code=410, detail="Version is older than the change log, resync from /workitems")
+    return WorkItemChangesDTO(
+        version=workitems.version,
+        epoch=workitems.version_epoch,
+        changes=[
+            WorkItemChangeDTO(
+                version=version,
+                op="delete" if item is None else "put",
+                ID=id,
+                item=None if item is None else to_dto(item),
+            )
+            for version, id, item in changes
+        ],
+    )
+
+@app.get("/workitems/events")
+async def stream_work_item_events(request: Request):
+    """Server-Sent Events feed of work item changes, resumable with Last-Event-ID."""
+    last_event_id = request.headers.get("last-event-id", "")
+
+    def backlog():
+        if not last_event_id:
+            return ""
+        epoch, _, version = last_event_id.rpartition("-")
+        changes = None
+        if version.isdigit() and is_current_version(epoch, int(version)):
+            changes = workitems.changes_since(int(version))
+        if changes is None:
+            return resync_frame(workitems.version, workitems.version_epoch)
+        return "".join(change_frame(*change, workitems.version_epoch) for change in changes)
+
+    return StreamingResponse(
+        change_feed.subscribe(backlog, lambda: workitems.version),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/workitems/search", response_model=list[WorkItemsDTO])
+async def search_work_items(q: str, limit: int = Query(20, ge=1, le=100)):
+    """Ranks work items by BM25 over Title and Tags; a trailing * matches prefixes."""
+    if search_index is None:
+        await asyncio.shield(start_search_index())
+    # Another worker may have deleted a match that this worker has not synced yet
+    items = (workitems.get(id) for _, id in search_index.search(q, limit))
+    return json_response(records_json(item for item in items if item is not None))
+
+def build_work_item_stats():
+    return WorkItemStatsDTO(
+        total=len(workitems),
+        byState=workitems.counts("State"),
+        byType=workitems.counts("WorkItemType"),
+        byAssignedTo=workitems.counts("AssignedTo"),
+        breakdown=[
+            WorkItemCountDTO(WorkItemType=work_item_type, State=state, AssignedTo=assigned_to, count=count)
+            for (work_item_type, state, assigned_to), count in workitems.breakdown().items()
+        ],
+    ).model_dump_json().encode()
+
+@app.get("/workitems/stats", response_model=WorkItemStatsDTO)
+async def get_work_item_stats(request: Request):
+    """Counts by State, WorkItemType and AssignedTo, maintained on every write."""
+    return cached_json_response(request, ("workitemstats",), build_work_item_stats)
+
+@app.post("/workitems:lookup", response_model=list[WorkItemLookupDTO])
+async def lookup_work_items(
+    request: Request,
+    ids: list[int] = Body(..., max_length=1000),
+    fields: str | None = Query(None, description="Comma-separated fields to return, e.g. ID,Title,State"),
+):
+    """Resolves many IDs in one request, answering in request order with a 404 entry for each missing ID."""
+    fields = parse_fields(fields) or CSV_COLUMNS
+    results = [
+        {"ID": id, "status": 404, "detail": "Work item not found"}
+        if item is None
+        else {"ID": id, "status": 200, "item": {field: getattr(item, field) for field in fields}}
+        for id, item in zip(ids, workitems.get_many(ids))
+    ]
+    return compressed_json_response(request, dumps(results))
+
+def item_etag(version):
+    return f'"{version_tag(version)}"'
+
+def current_item(work_item):
+    """Returns (body, headers) for an item as stored right now, so the body and its ETag always match."""
+    current, version = workitems.get_versioned(work_item.ID)
+    if current is None:
+        return record_json(work_item), {}
+    return record_json(current), {"ETag": item_etag(version)}
+
+IF_MATCH_REQUIRED = "If-Match is required; send the ETag from GET /workitems/{id}"
+
+PRECONDITION_RESPONSES = {
+    412: {"description": "The item changed since the ETag sent in If-Match; the response carries the current ETag"},
+    428: {"description": IF_MATCH_REQUIRED},
+}
+
+def required_version(if_match, version):
+    """Resolves If-Match to the version a write must still find, or None for `*`."""
+    if if_match is None:
+        raise HTTPException(status_code=428, detail=IF_MATCH_REQUIRED)
+    if if_match.strip() == "*":
+        return None
+    if not etag_matches(if_match, item_etag(version)):
+        raise precondition_failed(version)
+    return version
+
+def precondition_failed(version):
+    headers = {"ETag": item_etag(version)} if version is not None else None
+    return HTTPException(status_code=412, detail="Work item has changed", headers=headers)
 
 @app.get("/workitems/{id}", response_model=WorkItemsDTO)
-async def get_work_item_by_id(id: int):
-    work_item = next((item for item in workitems if item.ID == id), None)
+async def get_work_item_by_id(id: int, if_none_match: str | None = Header(None, alias="If-None-Match")):
+    work_item, version = workitems.get_versioned(id)
     if not work_item:
         raise HTTPException(status_code=404, detail="Work item not found")
-    return work_item
+    etag = item_etag(version)
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return json_response(record_json(work_item), {"ETag": etag})
 
 @app.post("/workitems", response_model=WorkItemsDTO, status_code=201)
-async def create_work_item(new_work_item: WorkItemsDTO):
-    workitems.append(new_work_item)
-    workItemTypes.add(new_work_item.WorkItemType)
-    workItemStates.add(new_work_item.State)
-    return new_work_item
-
-@app.put("/workitems/{id}", response_model=WorkItemsDTO)
-async def update_work_item(id: int, updated_work_item: WorkItemsDTO):
-    work_item = next((item for item in workitems if item.ID == id), None)
+async def create_work_item(
+    new_work_item: NewWorkItemDTO,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+):
+    def create():
+        try:
+            work_item = workitems.add(new_record(new_work_item))
+        except KeyError:
+            raise HTTPException(status_code=409, detail="Work item already exists")
+        return work_item, (201, *current_item(work_item))
+
+    async def persist(work_item):
+        await journal.put(work_item, undo=undoing([(work_item.ID, None)]))
+
+    status, body, headers = await run_idempotent(
+        idempotency_key, new_work_item.model_dump_json(), create, persist
+    )
+    return json_response(body, headers, status_code=status)
+
+def apply_update(id, updated_work_item, expected_version=None):
+    changes = {
+        field: value
+        for field, value in updated_work_item.model_dump(exclude={"ID"}).items()
+        if value
+    }
+    return workitems.update(id, changes, expected_version)
+
+@app.put("/workitems/{id}", response_model=WorkItemsDTO, responses=PRECONDITION_RESPONSES)
+async def update_work_item(
+    id: int,
+    updated_work_item: WorkItemsDTO,
+    if_match: str = Header(..., alias="If-Match"),
+):
+    """Updates an item only if it is still at the version named by If-Match; 412 otherwise."""
+    previous, version = workitems.get_versioned(id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Work item not found")
+    try:
+        work_item = await run_store(apply_update, id, updated_work_item, required_version(if_match, version))
+    except VersionConflict:
+        raise precondition_failed(workitems.get_versioned(id)[1])
     if not work_item:
         raise HTTPException(status_code=404, detail="Work item not found")
-    if updated_work_item.WorkItemType:
-        work_item.WorkItemType = updated_work_item.WorkItemType
-        workItemTypes.add(updated_work_item.WorkItemType)
-    if updated_work_item.Title:
-        work_item.Title = updated_work_item.Title
-    if updated_work_item.AssignedTo:
-        work_item.AssignedTo = updated_work_item.AssignedTo
-    if updated_work_item.State:
-        work_item.State = updated_work_item.State
-        workItemStates.add(updated_work_item.State)
-    if updated_work_item.Tags:
-        work_item.Tags = updated_work_item.Tags
-    return work_item
-
-@app.delete("/workitems/{id}", status_code=204)
-async def delete_work_item(id: int):
-    global workitems
-    work_item = next((item for item in workitems if item.ID == id), None)
+    body, headers = current_item(work_item)
+    await journal.put(work_item, undo=undoing([(id, previous)]))
+    return json_response(body, headers)
+
+@app.delete("/workitems/{id}", status_code=204, responses=PRECONDITION_RESPONSES)
+async def delete_work_item(id: int, if_match: str = Header(..., alias="If-Match")):
+    """Deletes an item only if it is still at the version named by If-Match; 412 otherwise."""
+    _, version = workitems.get_versioned(id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Work item not found")
+    try:
+        work_item = await run_store(workitems.delete, id, required_version(if_match, version))
+    except VersionConflict:
+        raise precondition_failed(workitems.get_versioned(id)[1])
     if not work_item:
         raise HTTPException(status_code=404, detail="Work item not found")
-    workitems = [item for item in workitems if item.ID != id]
+    await journal.delete(id, undo=undoing([(id, work_item)]))
     return
 
+@app.post("/workitems:batch", response_model=list[BatchResultDTO])
+async def create_work_items(
+    new_work_items: list[NewWorkItemDTO],
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+):
+    def create_all():
+        results, created = [], []
+        for new_work_item in new_work_items:
+            record = new_record(new_work_item)
+            try:
+                created.append(workitems.add(record))
+            except KeyError:
+                results.append({"ID": record.ID, "status": 409, "detail": "Work item already exists"})
+                continue
+            results.append({"ID": record.ID, "status": 201, "detail": None})
+        return created, (200, dumps(results), {})
+
+    async def persist(created):
+        await journal.append(
+            *(put_record(item) for item in created), undo=undoing([(item.ID, None) for item in created])
+        )
+
+    fingerprint = "[" + ",".join(new_work_item.model_dump_json() for new_work_item in new_work_items) + "]"
+    status, body, headers = await run_idempotent(idempotency_key, fingerprint, create_all, persist)
+    return json_response(body, headers, status_code=status)
+
+@app.patch("/workitems:batch", response_model=list[BatchResultDTO])
+async def update_work_items(updated_work_items: list[WorkItemsDTO]):
+    def update_all():
+        results, updated, previous = [], [], []
+        for updated_work_item in updated_work_items:
+            before = workitems.get(updated_work_item.ID)
+            work_item = apply_update(updated_work_item.ID, updated_work_item)
+            if not work_item:
+                results.append(BatchResultDTO(ID=updated_work_item.ID, status=404, detail="Work item not found"))
+                continue
+            updated.append(work_item)
+            previous.append((work_item.ID, before))
+            results.append(BatchResultDTO(ID=updated_work_item.ID, status=200))
+        return results, updated, previous
+
+    results, updated, previous = await run_store(update_all)
+    await journal.append(*(put_record(item) for item in updated), undo=undoing(previous))
+    return results
+
+@app.delete("/workitems:batch", response_model=list[BatchResultDTO])
+async def delete_work_items(ids: list[int]):
+    def delete_all():
+        results, deleted = [], []
+        for id in ids:
+            work_item = workitems.delete(id)
+            if not work_item:
+                results.append(BatchResultDTO(ID=id, status=404, detail="Work item not found"))
+                continue
+            deleted.append((id, work_item))
+            results.append(BatchResultDTO(ID=id, status=204))
+        return results, deleted
+
+    results, deleted = await run_store(delete_all)
+    await journal.append(*(delete_record(id) for id, _ in deleted), undo=undoing(deleted))
+    return results
+
 @app.get("/workitemtypes", response_model=list[str])
-async def get_work_item_types():
-    return list(workItemTypes)
+async def get_work_item_types(request: Request):
+    return cached_json_response(request, ("workitemtypes",), lambda: json.dumps(workitems.values("WorkItemType")).encode())
+
+@app.get("/workitemtags", response_model=list[str])
+async def get_work_item_tags(request: Request):
+    return cached_json_response(request, ("workitemtags",), lambda: json.dumps(workitems.tags()).encode())
 
 @app.get("/workitemstates", response_model=list[str])
-async def get_work_item_states():
-    return list(workItemStates)
+async def get_work_item_states(request: Request):
+    return cached_json_response(request, ("workitemstates",), lambda: json.dumps(workitems.values("State")).encode())
 
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
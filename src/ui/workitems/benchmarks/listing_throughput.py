@@ -0,0 +1,69 @@
+"""Compares work item listing serialization: response_model validation vs the record fast path.
+
+The "response_model" path mirrors what FastAPI does for a declared
+response_model: dump each DTO to a dict, validate the list against the
+model, serialize it back to JSON-compatible data and encode it. The
+"records" path is what GET /workitems now does.
+
+Run from src/ui/workitems:
+
+    python benchmarks/listing_throughput.py --items 10000 --rounds 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel, TypeAdapter
+from serialization import orjson, records_json
+from store import WorkItemRecord
+
+
+class WorkItemsDTO(BaseModel):
+    ID: int
+    WorkItemType: str
+    Title: str
+    AssignedTo: str
+    State: str
+    Tags: str
+
+
+def timed(rounds, fn):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        body = fn()
+    return (time.perf_counter() - started) / rounds, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    records = [
+        WorkItemRecord.create(i, "Task", f"Work item number {i}", "User1", "Active", "payments; refund")
+        for i in range(args.items)
+    ]
+    dtos = [WorkItemsDTO(**record._asdict()) for record in records]
+    adapter = TypeAdapter(list[WorkItemsDTO])
+
+    def response_model_path():
+        content = [dto.model_dump() for dto in dtos]
+        validated = adapter.validate_python(content)
+        return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+    before, size = timed(args.rounds, response_model_path)
+    after, _ = timed(args.rounds, lambda: records_json(records))
+    print(f"items per listing:   {args.items} ({size / 1024:.0f} KiB)")
+    print(f"encoder:             {'orjson' if orjson else 'json'}")
+    print(f"response_model:      {before * 1000:8.2f} ms/listing  {args.items / before:12.0f} items/s")
+    print(f"records fast path:   {after * 1000:8.2f} ms/listing  {args.items / after:12.0f} items/s")
+    print(f"speedup:             {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
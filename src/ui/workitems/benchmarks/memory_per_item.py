@@ -0,0 +1,107 @@
+"""Compares resident bytes per stored work item: pydantic DTOs vs the live store.
+
+The store rows cover everything a running server keeps per item: the
+records plus the store's sequence numbers, versions, indexes and change
+log, and then the search index on top.
+
+Run from src/ui/workitems:
+
+    python benchmarks/memory_per_item.py --items 200000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+from search import SearchIndex
+from store import WorkItemRecord, WorkItemStore
+
+TYPES = ["Bug", "Epic", "Feature", "Task", "User Story"]
+STATES = ["New", "Active", "Closed", "Resolved"]
+PEOPLE = ["", "User1", "User2", "User3"]
+TAGS = ["", "", "backend", "frontend; ux", "payments"]
+WORDS = ["login", "page", "error", "payment", "refund", "slow", "export", "report", "fails", "profile"]
+
+
+class WorkItemsDTO(BaseModel):
+    ID: int
+    WorkItemType: str
+    Title: str
+    AssignedTo: str
+    State: str
+    Tags: str
+
+
+def rows(count):
+    # Build each string fresh, the way csv.reader hands them to the loader
+    for i in range(count):
+        yield (
+            i + 1,
+            "".join(TYPES[i % len(TYPES)]),
+            f"{WORDS[i % len(WORDS)]} {WORDS[i // 10 % len(WORDS)]} work item {i}",
+            "".join(PEOPLE[i % len(PEOPLE)]),
+            "".join(STATES[i % len(STATES)]),
+            "".join(TAGS[i % len(TAGS)]),
+        )
+
+
+def measure(count, build):
+    gc.collect()
+    tracemalloc.start()
+    kept = build(rows(count))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size / count
+
+
+def build_dtos(rows):
+    return {
+        row[0]: WorkItemsDTO(ID=row[0], WorkItemType=row[1], Title=row[2], AssignedTo=row[3], State=row[4], Tags=row[5])
+        for row in rows
+    }
+
+
+def build_records(rows):
+    return {row[0]: WorkItemRecord.create(*row) for row in rows}
+
+
+def build_store(rows):
+    store = WorkItemStore()
+    with store.bulk():
+        for row in rows:
+            store.add(WorkItemRecord.create(*row))
+    return store
+
+
+def build_store_and_search(rows):
+    store = build_store(rows)
+    index = SearchIndex()
+    for item in store.snapshot():
+        index.add(item.ID, f"{item.Title} {item.Tags}")
+    return store, index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200000)
+    args = parser.parse_args()
+
+    dtos = measure(args.items, build_dtos)
+    print(f"items:                       {args.items}")
+    print(f"dict of WorkItemsDTO:        {dtos:8.1f} bytes/item")
+    for label, build in (
+        ("dict of WorkItemRecord:", build_records),
+        ("WorkItemStore:", build_store),
+        ("WorkItemStore + SearchIndex:", build_store_and_search),
+    ):
+        size = measure(args.items, build)
+        print(f"{label:28} {size:8.1f} bytes/item  ({dtos / size:.2f}x smaller than DTOs)")
+
+
+if __name__ == "__main__":
+    main()
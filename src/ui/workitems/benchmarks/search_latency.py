@@ -0,0 +1,63 @@
+"""Measures search index build time and query latency on a synthetic corpus.
+
+Titles draw words from a Zipf-like vocabulary, so common terms have long
+posting lists, and a few tags are mixed in the way work items carry them.
+
+Run from src/ui/workitems:
+
+    python benchmarks/search_latency.py --items 1000000
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex
+
+WORDS = [
+    "payment", "refund", "login", "error", "page", "checkout", "cart", "user", "profile", "update",
+    "fails", "slow", "report", "export", "import", "payments", "payload", "payroll", "paypal", "search",
+]
+TAGS = ["backend", "frontend", "payments", "refund", "security", "ux"]
+QUERIES = ["refund", "payment refund", "pay*", "login error page", "checkout fails", "zzz"]
+
+
+def documents(count, seed=1):
+    rng = random.Random(seed)
+    vocabulary = WORDS + [f"word{i}" for i in range(20000)]
+    # Zipf-like weights: a handful of very common words and a long tail
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for id in range(count):
+        title = " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(3, 10)))
+        tags = "; ".join(rng.sample(TAGS, rng.randint(0, 2)))
+        yield id, f"{title} {tags}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = list(documents(args.items))
+    index = SearchIndex()
+    started = time.perf_counter()
+    for id, text in corpus:
+        index.add(id, text)
+    print(f"items:       {args.items}")
+    print(f"build:       {time.perf_counter() - started:8.2f} s")
+    for query in QUERIES:
+        index.search(query)
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            results = index.search(query)
+        elapsed = (time.perf_counter() - started) / args.rounds
+        print(f"{query!r:20} {elapsed * 1000:8.3f} ms  {len(results)} results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Measures GET throughput of the work item API as uvicorn worker count grows.
+
+Each run starts `uvicorn api:app --workers N` on the SQLite backend against
+one shared database file, then drives it with several client processes.
+Reads alternate between a single item and a filtered listing so they are
+not all served from one cached body.
+
+Clients open a new connection per request. uvicorn's multi-worker mode
+hands workers a socket without TCP_NODELAY, so keep-alive requests there
+stall on Nagle plus delayed ACKs and would hide the scaling we measure.
+
+Run from src/ui/workitems:
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 --seconds 5
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+WORKITEMS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ["/workitems/{id}", "/workitems?state=Active&limit=20"]
+
+
+def client(port, seconds, results):
+    deadline = time.monotonic() + seconds
+    count = 0
+    while time.monotonic() < deadline:
+        path = PATHS[count % len(PATHS)].format(id=count % 70 + 1)
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        connection.request("GET", path, headers={"Connection": "close"})
+        connection.getresponse().read()
+        connection.close()
+        count += 1
+    results.put(count)
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/workitemtypes")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+
+def run(workers, clients, seconds, port, database):
+    # No checkpoints, so a run never rewrites the tracked seed CSV
+    env = dict(
+        os.environ,
+        WORKITEMS_STORAGE="sqlite",
+        WORKITEMS_SQLITE_PATH=database,
+        WORKITEMS_CHECKPOINT_INTERVAL="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=WORKITEMS_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(port)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=client, args=(port, seconds, results)) for _ in range(clients)]
+        for process in processes:
+            process.start()
+        total = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        return total / seconds
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "workitems.db")
+        baseline = None
+        for workers in args.workers:
+            rps = run(workers, args.clients, args.seconds, args.port, database)
+            baseline = baseline or rps
+            print(f"workers={workers:<3} {rps:10.0f} req/s  {rps / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
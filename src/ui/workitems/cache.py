@@ -0,0 +1,23 @@
+class ResponseCache:
+    """Serialized response bodies for the current data version.
+
+    Entries are keyed by endpoint and query. The whole cache is dropped as
+    soon as a request arrives for a newer version, so it never serves stale
+    bytes and never grows beyond one version's worth of entries.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._version = None
+        self._entries = {}
+
+    def get_or_build(self, key, version, build):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        body = self._entries.get(key)
+        if body is None:
+            body = build()
+            if len(self._entries) < self.max_entries:
+                self._entries[key] = body
+        return body
@@ -0,0 +1,64 @@
+import asyncio
+
+from journal import write_csv_atomically
+
+DURABLE_POLL_INTERVAL = 0.01
+
+
+class CsvCheckpointer:
+    """Periodically rewrites a CSV file with the live work items.
+
+    Every `interval` seconds the store version is compared with the version
+    last written. Nothing is written while they match, and any number of
+    mutations in between collapse into a single rewrite. Rows come from a
+    store snapshot and are written in a worker thread through a temp file
+    and rename, so the event loop never waits on disk I/O and readers of
+    the file never see it half written.
+
+    `durable` says whether every change in the store has been persisted.
+    The snapshot is only taken while it returns True, so the file never
+    holds a change that a failed journal write could still undo.
+
+    When several workers share a store, `leader` is called (in a worker
+    thread) before each checkpoint and only the process it returns True
+    for writes the file.
+    """
+
+    def __init__(
+        self, path, columns, store, interval, encoding='utf-8-sig', durable=None, written_version=None, leader=None
+    ):
+        self.path = path
+        self.columns = columns
+        self.store = store
+        self.interval = interval
+        self.encoding = encoding
+        self.durable = durable or (lambda: True)
+        self.written_version = written_version
+        self.leader = leader
+        self.checkpoints = 0
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.checkpoint()
+            except OSError as error:
+                print(f"Work item checkpoint to {self.path} failed, retrying next interval: {error}")
+
+    async def checkpoint(self):
+        """Writes the file if the store changed since the last checkpoint; returns whether it did."""
+        if self.leader is not None and not await asyncio.to_thread(self.leader):
+            return False
+        while True:
+            version = self.store.version
+            if version == self.written_version:
+                return False
+            if self.durable():
+                break
+            await asyncio.sleep(DURABLE_POLL_INTERVAL)
+        await asyncio.to_thread(
+            write_csv_atomically, self.path, self.columns, self.store.snapshot(), self.encoding
+        )
+        self.written_version = version
+        self.checkpoints += 1
+        return True
@@ -0,0 +1,56 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this gain little and cost a round of compression
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding):
+    """Picks the content coding for a response from an Accept-Encoding header.
+
+    Returns "br" or "gzip", preferring the client's highest q-value and
+    brotli on a tie, or None for an identity response. Brotli is only
+    offered when the brotli package is installed.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, parameters = part.partition(";")
+        weight = 1.0
+        parameters = parameters.strip()
+        if parameters.startswith("q="):
+            try:
+                weight = float(parameters[2:])
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in supported_encodings():
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(body, encoding):
+    """Returns (body, encoding) with `body` in the given content coding.
+
+    Small bodies are left alone, in which case the returned encoding is
+    None and the response goes out as identity.
+    """
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), encoding
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), encoding
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from collections import deque
+
+RESYNC = object()
+
+
+def change_frame(version, id, item, epoch=""):
+    """Encodes one store change as a Server-Sent Events frame.
+
+    The event ID is "<epoch>-<version>", so a Last-Event-ID sent after the
+    store's versions were renumbered can be told apart from a current one.
+    """
+    if item is None:
+        return f'id: {epoch}-{version}\nevent: delete\ndata: {json.dumps({"ID": id})}\n\n'
+    return f"id: {epoch}-{version}\nevent: put\ndata: {json.dumps(item._asdict())}\n\n"
+
+
+def resync_frame(version, epoch=""):
+    return f'event: resync\ndata: {json.dumps({"version": version, "epoch": epoch})}\n\n'
+
+
+class ChangeFeed:
+    """Fans work item changes out to Server-Sent Events subscribers.
+
+    Each change is encoded once. Changes published during the same event
+    loop iteration are coalesced into one batch, and each subscriber's
+    bounded queue receives one entry per batch, so subscribers wake once
+    per batch rather than once per change. A subscriber whose queue fills
+    up has its backlog dropped and is told to resync.
+
+    `publish` may be called from any thread, as store writers running in
+    worker threads do. Frames are queued thread-safely and the flush is
+    handed to the event loop the subscribers were registered on.
+    """
+
+    def __init__(self, epoch="", max_queued_batches=100, heartbeat_seconds=15):
+        self.epoch = epoch
+        self.max_queued_batches = max_queued_batches
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscribers = set()
+        self._pending = deque()
+        self._flush_scheduled = False
+        self._loop = None
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def publish(self, version, id, item):
+        if not self._subscribers:
+            return
+        self._pending.append(change_frame(version, id, item, self.epoch))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self):
+        # Cleared before draining, so a frame queued after the drain schedules another flush
+        self._flush_scheduled = False
+        frames = []
+        while self._pending:
+            frames.append(self._pending.popleft())
+        if not frames:
+            return
+        batch = "".join(frames)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                self._resync(queue)
+
+    def resync(self):
+        """Drops every subscriber's backlog and tells it to resync, e.g. after changes were missed."""
+        if self._subscribers:
+            self._loop.call_soon_threadsafe(self._resync_all)
+
+    def _resync_all(self):
+        for queue in self._subscribers:
+            self._resync(queue)
+
+    def _resync(self, queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+    async def subscribe(self, backlog, current_version):
+        """Yields SSE frames until the client goes away.
+
+        `backlog` is called right after the subscriber is registered, so the
+        frames it returns and the live batches neither overlap nor leave gaps.
+        """
+        queue = asyncio.Queue(maxsize=self.max_queued_batches)
+        self._loop = asyncio.get_running_loop()
+        self._subscribers.add(queue)
+        try:
+            yield f"retry: 3000\n\n{backlog()}"
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if batch is RESYNC:
+                    yield resync_frame(current_version(), self.epoch)
+                else:
+                    yield batch
+        finally:
+            self._subscribers.discard(queue)
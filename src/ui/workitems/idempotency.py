@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different request."""
+
+
+class IdempotencyCache:
+    """Recent responses keyed by the client's Idempotency-Key header.
+
+    The first request with a key runs and its (status, body) is kept for
+    `ttl_seconds`. Retries with the same key and request body get the
+    stored response back without running again; a retry that arrives while
+    the first request is still running waits for it. At most `max_entries`
+    keys are kept, the oldest going first.
+
+    Entries live in the process, so with several workers a retry is only
+    deduplicated when it reaches the worker that served the original. Use
+    SqliteIdempotencyCache when workers share a SQLite store.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=24 * 60 * 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def run(self, key, fingerprint, write, persist):
+        """Returns (status, body, headers, replayed), writing only for a new key.
+
+        `write` makes the store changes and returns (result, response), and
+        `persist` is then awaited with the result, e.g. to journal it.
+        Failed requests are not remembered, so the client can retry them.
+        """
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, stored_fingerprint, result = entry
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyConflict(key)
+            return (*await asyncio.shield(result), True)
+        result = asyncio.get_running_loop().create_future()
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, fingerprint, result)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        try:
+            written, response = write()
+            await persist(written)
+        except BaseException as error:
+            if self._entries.get(key, (None, None, None))[2] is result:
+                del self._entries[key]
+            if isinstance(error, asyncio.CancelledError):
+                result.cancel()
+            else:
+                result.set_exception(error)
+                # Mark the exception as retrieved in case nobody is waiting
+                result.exception()
+            raise
+        result.set_result(response)
+        return (*response, False)
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            expires, _, _ = next(iter(self._entries.values()))
+            if expires > now:
+                return
+            self._entries.popitem(last=False)
+
+
+class SqliteIdempotencyCache:
+    """Idempotency-Key responses kept in a shared SQLite store.
+
+    The key is looked up and the response stored inside the same write
+    transaction as the items it created, so a retry that reaches any
+    worker replays the original response, and two racing requests with one
+    key cannot both write. Writes run in a worker thread, as every SQLite
+    write does.
+    """
+
+    def __init__(self, store, ttl_seconds=24 * 60 * 60):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+
+    async def run(self, key, fingerprint, write, persist):
+        """Returns (status, body, headers, replayed); see IdempotencyCache.run."""
+        written, response, replayed = await asyncio.to_thread(self._run, key, fingerprint, write)
+        if not replayed:
+            await persist(written)
+        return (*response, replayed)
+
+    def _run(self, key, fingerprint, write):
+        now = time.time()
+        with self.store.bulk():
+            stored = self.store.stored_response(key, now)
+            if stored is not None:
+                stored_fingerprint, response = stored
+                if stored_fingerprint != fingerprint:
+                    raise IdempotencyConflict(key)
+                return None, response, True
+            written, response = write()
+            self.store.store_response(key, fingerprint, response, now + self.ttl_seconds, now)
+        return written, response, False
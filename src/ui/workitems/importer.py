@@ -0,0 +1,139 @@
+import codecs
+import csv
+import io
+
+
+class CsvChunker:
+    """Cuts a stream of CSV bytes into text batches of whole rows.
+
+    `feed` only buffers bytes, so it is cheap enough for the event loop;
+    `take` and `finish` decode and cut and belong on a worker thread.
+    Bytes are decoded incrementally, so multi-byte characters split across
+    chunks are fine. A batch always ends at a newline outside a quoted
+    field, so rows with embedded newlines are never cut in half. Quote
+    parity is carried along, so each text is scanned once, and the
+    incomplete tail may grow to `max_pending` characters before the row
+    is rejected, so an unmatched quote can't buffer the whole upload.
+    """
+
+    def __init__(self, batch_size=256 * 1024, max_pending=None):
+        self.batch_size = batch_size
+        self.max_pending = max_pending or 4 * batch_size
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._chunks = []
+        self._buffered = 0
+        self._pending = ""
+        # How far _pending has been scanned, whether that part has an odd number of
+        # quotes, and the offset just past the last newline in it that ends a row
+        self._scanned = 0
+        self._odd = False
+        self._rows_end = 0
+
+    def feed(self, chunk):
+        """Buffers a chunk; returns True once a batch's worth is waiting for `take`."""
+        self._chunks.append(chunk)
+        self._buffered += len(chunk)
+        return self._buffered >= self.batch_size
+
+    def take(self):
+        """Returns the complete rows buffered so far, or None if no row has ended yet.
+
+        Raises ValueError when more than `max_pending` characters have come
+        without the end of a row.
+        """
+        self._decode()
+        end = self._rows_end
+        if len(self._pending) - end > self.max_pending:
+            raise ValueError(
+                f"A CSV row runs past {self.max_pending} characters without ending; is a quote left open?"
+            )
+        if not end:
+            return None
+        batch, self._pending = self._pending[:end], self._pending[end:]
+        self._scanned -= end
+        self._rows_end = 0
+        return batch
+
+    def finish(self):
+        """Returns whatever is left once the stream ends."""
+        self._decode(final=True)
+        batch, self._pending = self._pending, ""
+        self._scanned = self._rows_end = 0
+        return batch
+
+    def _decode(self, final=False):
+        chunks, self._chunks = self._chunks, []
+        self._buffered = 0
+        self._pending += self._decoder.decode(b"".join(chunks), final=final)
+        self._scan()
+
+    def _scan(self):
+        """Finds the last row end in the text added since the previous scan.
+
+        Quotes inside fields are doubled, so a newline ends a row exactly
+        when the number of quotes before it is even. Walking back from the
+        end usually stops at the first newline.
+        """
+        text, start = self._pending, self._scanned
+        odd = self._odd ^ (text.count('"', start) % 2 == 1)
+        self._odd, self._scanned = odd, len(text)
+        end = len(text)
+        while True:
+            newline = text.rfind("\n", start, end)
+            if newline < 0:
+                return
+            odd ^= text.count('"', newline, end) % 2 == 1
+            if not odd:
+                self._rows_end = newline + 1
+                return
+            end = newline
+
+
+def header_positions(header, columns):
+    """Maps `columns` to their positions in a CSV header; raises ValueError naming missing ones."""
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return [header.index(column) for column in columns]
+
+
+def parse_rows(text, columns, positions=None, first_row=1):
+    """Parses a batch of CSV rows into (row number, fields, error) triples.
+
+    Without `positions` the first row is read as the header and mapped to
+    `columns`. Returns the positions along with the triples so the next
+    batch can reuse them. `fields` is a tuple in the order of `columns`
+    with the ID converted to an int, or None when blank; rows that cannot
+    be parsed, including rows the csv module rejects, have no fields and
+    the reason in `error`. Blank lines are skipped without using up a row
+    number. Only a bad header raises.
+    """
+    reader = csv.reader(io.StringIO(text, newline=""))
+    if positions is None:
+        positions = header_positions(next(reader, []), columns)
+    width = max(positions) + 1
+    results = []
+    row_number = first_row
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as error:
+            # The reader resumes at the next line, so only this row is lost
+            results.append((row_number, None, f"Malformed CSV: {error}"))
+            row_number += 1
+            continue
+        if not row:
+            continue
+        if len(row) < width:
+            results.append((row_number, None, f"Expected at least {width} columns, got {len(row)}"))
+        else:
+            id, *rest = (row[i] for i in positions)
+            id = id.strip()
+            try:
+                results.append((row_number, (int(id) if id else None, *rest), None))
+            except ValueError:
+                results.append((row_number, None, f"ID is not an integer: {id!r}"))
+        row_number += 1
+    return positions, results
@@ -0,0 +1,257 @@
+import asyncio
+import csv
+import json
+import os
+import tempfile
+
+
+class JournalError(Exception):
+    """Raised to writers whose records could not be made durable; their changes have been undone."""
+
+
+class WorkItemJournal:
+    """Append-only write-ahead journal for work item mutations.
+
+    Each mutation is one JSON line. Concurrent appends are group committed:
+    the first caller starts a flush task that writes every pending record
+    with a single fsync while later callers wait for that batch. Callers
+    wait through `asyncio.shield`, so a cancelled request never interrupts
+    a write that other requests are waiting on. After
+    `compact_every` records the current state is written to a CSV snapshot
+    and the journal is truncated.
+
+    Records are full-item upserts or deletes by ID, so replaying a record
+    that is already reflected in the snapshot is harmless.
+
+    Callers change the store first and pass an `undo` with their records.
+    If a batch cannot be written, the undos of that batch and of everything
+    queued behind it run newest first and the file is cut back to its last
+    durable length, so the store again holds exactly what a replay would
+    rebuild. Snapshots are only taken while nothing is waiting to be
+    written, so they never capture a change that might still be undone.
+    """
+
+    def __init__(self, journal_path, snapshot_path, columns, snapshot_rows, compact_every=10000):
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.columns = columns
+        self.snapshot_rows = snapshot_rows
+        self.compact_every = compact_every
+        self._file = None
+        self._durable_size = None
+        self._pending = []
+        self._undos = []
+        self._batch = None
+        self._flusher = None
+        self._writing = False
+        self._since_snapshot = 0
+
+    @property
+    def durable(self):
+        """True when every appended record has been fsync'd, so the store holds no change that could be undone."""
+        return not self._pending and not self._writing
+
+    def replay(self):
+        """Yields the journaled records in order, ignoring a torn final line.
+
+        The length of the last complete line is kept, so the first append
+        cuts a torn tail off instead of gluing its record onto it.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        self._durable_size = 0
+        with open(self.journal_path, mode='rb') as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._durable_size += len(line)
+                self._since_snapshot += 1
+                yield record
+
+    async def put(self, item, undo=None):
+        await self.append(put_record(item), undo=undo)
+
+    async def delete(self, id, undo=None):
+        await self.append(delete_record(id), undo=undo)
+
+    async def append(self, *records, undo=None):
+        """Queues records and returns once they have been fsync'd.
+
+        Raises JournalError, after calling `undo`, if they could not be written.
+        """
+        if not records:
+            return
+        self._pending.extend(json.dumps(record) for record in records)
+        if undo is not None:
+            self._undos.append(undo)
+        if self._batch is None:
+            self._batch = asyncio.get_running_loop().create_future()
+        batch = self._batch
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush())
+        await asyncio.shield(batch)
+
+    async def close(self):
+        if self._flusher is not None:
+            await asyncio.shield(self._flusher)
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+    async def _flush(self):
+        try:
+            await self._flush_pending()
+        finally:
+            self._flusher = None
+
+    async def _flush_pending(self):
+        while self._pending:
+            lines, self._pending = self._pending, []
+            undos, self._undos = self._undos, []
+            batch, self._batch = self._batch, None
+            self._writing = True
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except Exception as error:
+                await self._abort(batch, undos, error)
+                continue
+            finally:
+                self._writing = False
+            batch.set_result(None)
+            self._since_snapshot += len(lines)
+            if self._since_snapshot >= self.compact_every and not self._pending:
+                try:
+                    await self._compact()
+                except OSError as error:
+                    print(f"Work item snapshot failed, keeping the journal: {error}")
+
+    async def _abort(self, batch, undos, error):
+        """Fails a batch and everything queued behind it, undoing their changes newest first."""
+        self._pending = []
+        undos += self._undos
+        self._undos = []
+        waiting, self._batch = self._batch, None
+        for undo in reversed(undos):
+            try:
+                undo()
+            except Exception as undo_error:
+                print(f"Work item journal: could not undo an unsaved change: {undo_error!r}")
+        failure = JournalError(f"Could not write the work item journal: {error}")
+        failure.__cause__ = error
+        for future in (batch, waiting):
+            if future is not None:
+                future.set_exception(failure)
+        try:
+            await asyncio.to_thread(self._truncate)
+        except OSError as truncate_error:
+            print(f"Work item journal may hold unsaved records after a failed write: {truncate_error}")
+
+    def _write(self, lines):
+        if self._file is None:
+            self._file = open(self.journal_path, mode='a', encoding='utf-8')
+            size = os.fstat(self._file.fileno()).st_size
+            if self._durable_size is None:
+                self._durable_size = size
+            elif size > self._durable_size:
+                # a torn line left by a crash, or the remains of a failed batch
+                self._file.truncate(self._durable_size)
+                os.fsync(self._file.fileno())
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._durable_size = os.fstat(self._file.fileno()).st_size
+
+    def _truncate(self):
+        """Cuts the journal back to its last durable length, dropping any part of a failed batch."""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+        if self._durable_size is None:
+            return
+        with open(self.journal_path, mode='r+b') as file:
+            file.truncate(self._durable_size)
+            file.flush()
+            os.fsync(file.fileno())
+
+    async def _compact(self):
+        rows = self.snapshot_rows()
+        await asyncio.to_thread(self._write_snapshot, rows)
+        self._since_snapshot = 0
+
+    def _write_snapshot(self, rows):
+        write_csv_atomically(self.snapshot_path, self.columns, rows)
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, mode='w', encoding='utf-8')
+        os.fsync(self._file.fileno())
+        self._durable_size = 0
+
+
+class NullJournal:
+    """Journal stand-in for storage backends that are durable on their own."""
+
+    durable = True
+
+    def replay(self):
+        return iter(())
+
+    async def put(self, item, undo=None):
+        pass
+
+    async def delete(self, id, undo=None):
+        pass
+
+    async def append(self, *records, undo=None):
+        pass
+
+    async def close(self):
+        pass
+
+
+def put_record(item):
+    return {"op": "put", "item": item._asdict()}
+
+
+def delete_record(id):
+    return {"op": "delete", "id": id}
+
+
+def write_csv_atomically(path, columns, rows, encoding='utf-8'):
+    """Writes a CSV file to a temp file beside `path`, fsyncs it and renames it into place.
+
+    Readers see either the old file or the new one, never a partial write.
+    The temp name is unique, so several processes can checkpoint at once.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        # mkstemp creates the file owner-only; keep the permissions of the file being replaced
+        os.chmod(temp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        with open(fd, mode='w', encoding=encoding, newline='') as file:
+            writer = csv.writer(file, lineterminator="\n")
+            writer.writerow(columns)
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(path):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,250 @@
+import heapq
+import math
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r"\w+\*?")
+# New terms waiting to be merged into the sorted vocabulary before a prefix query
+MAX_UNSORTED_TERMS = 64
+# Stands in for the documents a query group does not match
+UNMATCHED = (0.0, None, None, 0)
+# Checking one document's tokens costs about as much as probing this many IDs against a set
+TOKEN_CHECK_COST = 32
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    """Incrementally maintained inverted index ranked with BM25.
+
+    Each term's postings are grouped into blocks of documents that share a
+    term frequency and a length. Every document in a block gets the same
+    BM25 contribution from the term, so a query can rank whole blocks
+    before reading any IDs: it visits combinations of blocks in falling
+    score order and stops once it has `limit` documents. A common term
+    costs about as much as a rare one.
+
+    A query term ending in `*` expands to at most `max_expansions` indexed
+    terms starting with it, and a document scores the best of the
+    expansions it contains. New terms collect in a set and are merged into
+    the sorted vocabulary with one sort when a prefix query needs it.
+
+    Methods take a lock, so writers on worker threads and searches on the
+    event loop can share one index.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, max_expansions=64):
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        # term -> {(term frequency, document length): array of IDs}
+        self._postings = {}
+        # id -> the document's tokens, which give its length and term frequencies
+        self._documents = {}
+        # id -> where the document sits in each of its terms' blocks, in first-occurrence order of
+        # the terms, so removing it swaps the last ID of each block into its place without a scan
+        self._positions = {}
+        self._total_length = 0
+        # Shared (term frequency, document length) keys, so rare terms don't each carry a copy
+        self._keys = {}
+        # Sorted vocabulary; may still hold terms that were removed since
+        self._terms = []
+        self._new_terms = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, id, text):
+        tokens = tuple(map(sys.intern, tokenize(text)))
+        with self._lock:
+            self._remove(id)
+            if not tokens:
+                return
+            self._documents[id] = tokens
+            positions = self._positions[id] = array("I")
+            length = len(tokens)
+            self._total_length += length
+            for term, frequency in Counter(tokens).items():
+                blocks = self._postings.get(term)
+                if blocks is None:
+                    blocks = self._postings[term] = {}
+                    self._new_terms.add(term)
+                key = (frequency, length)
+                ids = blocks.get(key)
+                if ids is None:
+                    positions.append(0)
+                    blocks[self._keys.setdefault(key, key)] = array("q", (id,))
+                else:
+                    positions.append(len(ids))
+                    ids.append(id)
+
+    def remove(self, id):
+        with self._lock:
+            self._remove(id)
+
+    def search(self, query, limit=20):
+        """Returns up to `limit` (score, id) pairs, best match first."""
+        with self._lock:
+            groups = [group for group in self._expand(QUERY_PATTERN.findall(query.lower())) if group]
+            if not groups or not self._total_length:
+                return []
+            k1 = self.k1
+            norms = (k1 * (1 - self.b), k1 * self.b * len(self._documents) / self._total_length)
+            return self._top(self._levels(groups, norms), len(groups), limit)
+
+    def _remove(self, id):
+        tokens = self._documents.pop(id, None)
+        if tokens is None:
+            return
+        positions = self._positions.pop(id)
+        length = len(tokens)
+        self._total_length -= length
+        for (term, frequency), position in zip(Counter(tokens).items(), positions):
+            blocks = self._postings[term]
+            ids = blocks[frequency, length]
+            last = ids.pop()
+            if last != id:
+                ids[position] = last
+                moved = self._positions[last]
+                moved[list(dict.fromkeys(self._documents[last])).index(term)] = position
+            if not ids:
+                del blocks[frequency, length]
+                if not blocks:
+                    del self._postings[term]
+                    self._new_terms.discard(term)
+
+    def _expand(self, terms):
+        """Returns one tuple of indexed terms per distinct query term."""
+        groups = []
+        for term in dict.fromkeys(terms):
+            if not term.endswith("*"):
+                groups.append((term,) if term in self._postings else ())
+                continue
+            if len(self._new_terms) > MAX_UNSORTED_TERMS:
+                self._sort_terms()
+            prefix = term.rstrip("*")
+            expansions = {candidate for candidate in self._new_terms if candidate.startswith(prefix)}
+            position = bisect_left(self._terms, prefix)
+            while position < len(self._terms) and len(expansions) < self.max_expansions:
+                candidate = self._terms[position]
+                if not candidate.startswith(prefix):
+                    break
+                if candidate in self._postings:
+                    expansions.add(candidate)
+                position += 1
+            groups.append(tuple(sorted(expansions)[:self.max_expansions]))
+        return groups
+
+    def _sort_terms(self):
+        terms = set(self._terms)
+        terms.update(self._new_terms)
+        self._terms = sorted(term for term in terms if term in self._postings)
+        self._new_terms = set()
+
+    def _levels(self, groups, norms):
+        """Returns, per document length, each group's blocks as (weight, IDs), heaviest first.
+
+        `weight` is what the block's documents get from the group. Each
+        list ends with a weightless block standing for documents the group
+        does not match.
+        """
+        document_count = len(self._documents)
+        base_norm, length_norm = norms
+        boost = self.k1 + 1
+        levels = {}
+        for number, group in enumerate(groups):
+            for term in group:
+                blocks = self._postings[term]
+                frequency_of_term = sum(map(len, blocks.values()))
+                idf = math.log(1 + (document_count - frequency_of_term + 0.5) / (frequency_of_term + 0.5))
+                for (frequency, length), ids in blocks.items():
+                    level = levels.get(length)
+                    if level is None:
+                        level = levels[length] = [[] for _ in groups]
+                    weight = idf * boost * frequency / (frequency + base_norm + length_norm * length)
+                    level[number].append((weight, ids, term, frequency))
+        for level in levels.values():
+            for blocks in level:
+                blocks.sort(key=_block_weight, reverse=True)
+                blocks.append(UNMATCHED)
+        return levels
+
+    def _top(self, levels, group_count, limit):
+        """Collects documents by visiting block combinations, highest total weight first.
+
+        Within one length, a combination of one block per group (or none)
+        sums to the score of every document in all of its blocks that no
+        heavier combination already returned: such a document gets at
+        least the combination's weight from each group, and if it got more
+        it would have come up earlier. Combinations come off a heap in
+        falling score order, so the first `limit` documents found are the
+        top ones and nothing below them is read.
+        """
+        queue = [
+            (-sum(blocks[0][0] for blocks in level), length, (0,) * group_count, 0)
+            for length, level in levels.items()
+        ]
+        heapq.heapify(queue)
+        top, seen, sets = [], set(), {}
+        while queue and len(top) < limit:
+            score, length, choice, last = heapq.heappop(queue)
+            level = levels[length]
+            # Step each position at or after the last one stepped, so every combination is queued once
+            for position in range(last, group_count):
+                if choice[position] + 1 < len(level[position]):
+                    successor = choice[:position] + (choice[position] + 1,) + choice[position + 1:]
+                    total = sum(level[number][index][0] for number, index in enumerate(successor))
+                    heapq.heappush(queue, (-total, length, successor, position))
+            matched = [level[number][index] for number, index in enumerate(choice)]
+            matched = sorted((block for block in matched if block[1] is not None), key=_block_size)
+            if not matched:
+                continue
+            ids = self._common(matched, length, sets)
+            for id in ids:
+                if id not in seen:
+                    seen.add(id)
+                    top.append((-score, id))
+                    if len(top) == limit:
+                        break
+        return top
+
+    def _common(self, blocks, length, sets):
+        """Returns the IDs found in every one of `blocks`, which come smallest first.
+
+        The first block is hashed, once per query, and the others are probed
+        against it. Once the IDs left are few next to the blocks still to
+        probe, each one's term frequencies are checked instead.
+        """
+        first = blocks[0]
+        common = first[1]
+        for position in range(1, len(blocks)):
+            rest = blocks[position:]
+            if len(common) * TOKEN_CHECK_COST < sum(map(_block_size, rest)):
+                documents = self._documents
+                return [
+                    id for id in common
+                    if all(documents[id].count(term) == frequency for weight, ids, term, frequency in rest)
+                ]
+            if position == 1:
+                key = (length, first[2], first[3])
+                common = sets.get(key)
+                if common is None:
+                    common = sets[key] = set(first[1])
+            common = common.intersection(blocks[position][1])
+        return common
+
+
+def _block_weight(block):
+    return block[0]
+
+
+def _block_size(block):
+    return len(block[1])
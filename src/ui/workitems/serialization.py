@@ -0,0 +1,29 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Serializes plain Python data to compact UTF-8 JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def record_json(record):
+    return dumps(record._asdict())
+
+
+def records_json(records, fields=None):
+    """Serializes stored records straight to JSON bytes.
+
+    Records were validated when they were written, so this skips building
+    DTOs and running response_model validation on every read. `fields`
+    limits each object to the named fields, in that order.
+    """
+    if fields is None:
+        return dumps([record._asdict() for record in records])
+    return dumps([{field: getattr(record, field) for field in fields} for record in records])
@@ -0,0 +1,455 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from store import INDEXED_FIELDS, VersionConflict, WorkItemRecord, WorkItemStorage, split_tags
+
+COLUMNS = "ID, WorkItemType, Title, AssignedTo, State, Tags"
+
+# Counts and the change log are maintained by triggers, so they commit in
+# the same transaction as the row change no matter which process wrote it.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workitems (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ID INTEGER NOT NULL UNIQUE,
+    WorkItemType TEXT NOT NULL,
+    Title TEXT NOT NULL,
+    AssignedTo TEXT NOT NULL,
+    State TEXT NOT NULL,
+    Tags TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS workitems_state ON workitems (State, seq);
+CREATE INDEX IF NOT EXISTS workitems_type ON workitems (WorkItemType, seq);
+CREATE INDEX IF NOT EXISTS workitems_assigned_to ON workitems (AssignedTo, seq);
+
+CREATE TABLE IF NOT EXISTS workitem_tags (
+    tag TEXT NOT NULL,
+    ID INTEGER NOT NULL,
+    PRIMARY KEY (tag, ID)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS workitem_tags_id ON workitem_tags (ID);
+
+CREATE TABLE IF NOT EXISTS workitem_counts (
+    WorkItemType TEXT NOT NULL,
+    State TEXT NOT NULL,
+    AssignedTo TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (WorkItemType, State, AssignedTo)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS workitem_changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    ID INTEGER NOT NULL,
+    deleted INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS workitem_changes_id ON workitem_changes (ID, version);
+
+-- Version of the change that last wrote each item; rows written before
+-- this table existed read as version 0
+CREATE TABLE IF NOT EXISTS workitem_versions (
+    ID INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+-- Names this database's version sequence, so versions remembered from a
+-- database that was since replaced are recognised as foreign
+CREATE TABLE IF NOT EXISTS workitem_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO workitem_meta VALUES ('epoch', lower(hex(randomblob(8))));
+
+-- Responses to requests sent with an Idempotency-Key, written in the same
+-- transaction as the items they created, so a retry is recognised by
+-- every worker
+CREATE TABLE IF NOT EXISTS workitem_idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    headers TEXT NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS workitem_idempotency_expires ON workitem_idempotency (expires);
+
+-- Roles that one process at a time holds until `expires`, such as
+-- writing the CSV checkpoint
+CREATE TABLE IF NOT EXISTS workitem_leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS workitem_ids (
+    singleton INTEGER PRIMARY KEY CHECK (singleton = 0),
+    next INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO workitem_ids SELECT 0, IFNULL(MAX(ID), 0) + 1 FROM workitems;
+
+CREATE TRIGGER IF NOT EXISTS workitems_insert_id AFTER INSERT ON workitems BEGIN
+    UPDATE workitem_ids SET next = new.ID + 1 WHERE next <= new.ID;
+END;
+
+CREATE TRIGGER IF NOT EXISTS workitems_insert AFTER INSERT ON workitems BEGIN
+    INSERT INTO workitem_counts VALUES (new.WorkItemType, new.State, new.AssignedTo, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+    INSERT INTO workitem_changes (ID, deleted) VALUES (new.ID, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS workitems_update AFTER UPDATE ON workitems BEGIN
+    UPDATE workitem_counts SET count = count - 1
+        WHERE WorkItemType = old.WorkItemType AND State = old.State AND AssignedTo = old.AssignedTo;
+    INSERT INTO workitem_counts VALUES (new.WorkItemType, new.State, new.AssignedTo, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+    DELETE FROM workitem_counts WHERE count = 0
+        AND WorkItemType = old.WorkItemType AND State = old.State AND AssignedTo = old.AssignedTo;
+    INSERT INTO workitem_changes (ID, deleted) VALUES (new.ID, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS workitems_delete AFTER DELETE ON workitems BEGIN
+    UPDATE workitem_counts SET count = count - 1
+        WHERE WorkItemType = old.WorkItemType AND State = old.State AND AssignedTo = old.AssignedTo;
+    DELETE FROM workitem_counts WHERE count = 0
+        AND WorkItemType = old.WorkItemType AND State = old.State AND AssignedTo = old.AssignedTo;
+    DELETE FROM workitem_tags WHERE ID = old.ID;
+    INSERT INTO workitem_changes (ID, deleted) VALUES (old.ID, 1);
+END;
+"""
+
+
+class SqliteWorkItemStore(WorkItemStorage):
+    """Work item store backed by a SQLite database in WAL mode.
+
+    Several processes can open the same file, so `uvicorn --workers N` can
+    share one data set. Filters use the (field, seq) indexes and the tag
+    table, counts and the change log are kept by triggers, and every query
+    is a constant SQL string so sqlite3's statement cache reuses the
+    prepared statement.
+
+    Listeners hear about local writes as soon as they commit. Writes made by
+    other processes reach them through `sync`, which the API calls on a
+    short interval, so in-process derived state such as the search index
+    and the change feed follows every worker's writes.
+
+    Writes go through one connection behind a lock, while every thread
+    reads through its own connection. WAL readers never wait for the writer
+    and only see committed transactions, so a reader can't observe a write
+    half applied. `snapshot` keeps one read transaction open while it
+    streams rows, so a long export sees a single version.
+    """
+
+    def __init__(self, path, changes_retained=100000, scan_batch_size=500):
+        self.path = path
+        self.changes_retained = changes_retained
+        self.scan_batch_size = scan_batch_size
+        self.listeners = []
+        self.resets = []
+        self._notifications = []
+        # Versions written by this process, added from worker threads and pruned by sync on the loop
+        self._local_versions = set()
+        self._local_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self._connection = self._connect()
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        self.version_epoch = self._connection.execute(
+            "SELECT value FROM workitem_meta WHERE key = 'epoch'"
+        ).fetchone()[0]
+        self._synced_version = self.version
+
+    def close(self):
+        for connection in self._readers:
+            connection.close()
+        self._connection.close()
+
+    @property
+    def version(self):
+        return self._reader().execute("SELECT IFNULL(MAX(version), 0) FROM workitem_changes").fetchone()[0]
+
+    def __len__(self):
+        return self._reader().execute("SELECT IFNULL(SUM(count), 0) FROM workitem_counts").fetchone()[0]
+
+    def get(self, id):
+        row = self._reader().execute(f"SELECT {COLUMNS} FROM workitems WHERE ID = ?", (id,)).fetchone()
+        return None if row is None else WorkItemRecord.create(*row)
+
+    def get_many(self, ids):
+        """Resolves every ID with one query; the IDs travel as a JSON array so the SQL stays constant."""
+        rows = self._reader().execute(
+            f"SELECT {COLUMNS} FROM workitems WHERE ID IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(ids)),),
+        )
+        found = {row[0]: WorkItemRecord.create(*row) for row in rows}
+        return [found.get(id) for id in ids]
+
+    def get_versioned(self, id):
+        row = self._reader().execute(
+            f"SELECT {COLUMNS}, IFNULL(v.version, 0) FROM workitems LEFT JOIN workitem_versions v USING (ID) WHERE ID = ?",
+            (id,),
+        ).fetchone()
+        return (None, None) if row is None else (WorkItemRecord.create(*row[:-1]), row[-1])
+
+    def add(self, item):
+        with self._transaction():
+            try:
+                self._connection.execute(f"INSERT INTO workitems ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", item)
+            except sqlite3.IntegrityError:
+                raise KeyError(item.ID)
+            self._insert_tags(item)
+            self._notify(item.ID, item)
+        return item
+
+    def allocate_id(self):
+        with self._transaction():
+            self._connection.execute("UPDATE workitem_ids SET next = next + 1")
+            return self._connection.execute("SELECT next - 1 FROM workitem_ids").fetchone()[0]
+
+    def update(self, id, changes, expected_version=None):
+        with self._transaction():
+            item, version = self.get_versioned(id)
+            if item is None:
+                return None
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(id)
+            item = WorkItemRecord.create(**{**item._asdict(), **changes})
+            self._connection.execute(
+                "UPDATE workitems SET WorkItemType = ?, Title = ?, AssignedTo = ?, State = ?, Tags = ? WHERE ID = ?",
+                (*item[1:], id),
+            )
+            self._connection.execute("DELETE FROM workitem_tags WHERE ID = ?", (id,))
+            self._insert_tags(item)
+            self._notify(id, item)
+        return item
+
+    def delete(self, id, expected_version=None):
+        with self._transaction():
+            item, version = self.get_versioned(id)
+            if item is None:
+                return None
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(id)
+            self._connection.execute("DELETE FROM workitems WHERE ID = ?", (id,))
+            self._notify(id, None)
+        return item
+
+    def stored_response(self, key, now):
+        """Returns (fingerprint, (status, body, headers)) kept for an Idempotency-Key, or None."""
+        row = self._reader().execute(
+            "SELECT fingerprint, status, body, headers FROM workitem_idempotency WHERE key = ? AND expires > ?",
+            (key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        fingerprint, status, body, headers = row
+        return fingerprint, (status, body, json.loads(headers))
+
+    def store_response(self, key, fingerprint, response, expires, now):
+        """Keeps a response for an Idempotency-Key until `expires`, dropping expired ones."""
+        status, body, headers = response
+        with self._transaction():
+            self._connection.execute("DELETE FROM workitem_idempotency WHERE expires <= ?", (now,))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO workitem_idempotency VALUES (?, ?, ?, ?, ?, ?)",
+                (key, fingerprint, status, body, json.dumps(headers), expires),
+            )
+
+    def acquire_lease(self, name, holder, seconds):
+        """Takes or renews a lease for `seconds` unless another holder's is live; returns whether `holder` has it."""
+        now = time.time()
+        with self._transaction():
+            self._connection.execute(
+                """
+                INSERT INTO workitem_leases VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires
+                WHERE holder = excluded.holder OR expires <= ?
+                """,
+                (name, holder, now + seconds, now),
+            )
+            row = self._connection.execute("SELECT holder FROM workitem_leases WHERE name = ?", (name,)).fetchone()
+        return row[0] == holder
+
+    def scan(self, after=-1, tags=(), any_tags=False, **criteria):
+        """Yields (seq, item) pairs in keyset batches so no cursor stays open across yields."""
+        where, parameters = ["seq > ?"], []
+        for field, value in criteria.items():
+            if value is not None:
+                if field not in INDEXED_FIELDS:
+                    raise ValueError(field)
+                where.append(f"{field} = ?")
+                parameters.append(value)
+        if tags and any_tags:
+            where.append(f"ID IN (SELECT ID FROM workitem_tags WHERE tag IN ({', '.join('?' * len(tags))}))")
+            parameters.extend(tags)
+        else:
+            for tag in tags:
+                where.append("ID IN (SELECT ID FROM workitem_tags WHERE tag = ?)")
+                parameters.append(tag)
+        query = f"SELECT seq, {COLUMNS} FROM workitems WHERE {' AND '.join(where)} ORDER BY seq LIMIT ?"
+        while True:
+            rows = self._reader().execute(query, (after, *parameters, self.scan_batch_size)).fetchall()
+            for row in rows:
+                yield row[0], WorkItemRecord.create(*row[1:])
+            if len(rows) < self.scan_batch_size:
+                return
+            after = rows[-1][0]
+
+    def snapshot(self):
+        """Yields every record in insertion order from a single read transaction."""
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN")
+            for row in connection.execute(f"SELECT {COLUMNS} FROM workitems ORDER BY seq"):
+                yield WorkItemRecord.create(*row)
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def tags(self):
+        return [row[0] for row in self._reader().execute("SELECT DISTINCT tag FROM workitem_tags")]
+
+    def tags_of(self, id):
+        return frozenset(row[0] for row in self._reader().execute("SELECT tag FROM workitem_tags WHERE ID = ?", (id,)))
+
+    def values(self, field):
+        return list(self.counts(field))
+
+    def counts(self, field):
+        if field not in INDEXED_FIELDS:
+            raise ValueError(field)
+        return dict(self._reader().execute(f"SELECT {field}, SUM(count) FROM workitem_counts GROUP BY {field}"))
+
+    def breakdown(self):
+        return {
+            (work_item_type, state, assigned_to): count
+            for work_item_type, state, assigned_to, count in self._reader().execute(
+                "SELECT WorkItemType, State, AssignedTo, count FROM workitem_counts"
+            )
+        }
+
+    def changes_since(self, version):
+        connection = self._reader()
+        oldest = connection.execute("SELECT MIN(version) FROM workitem_changes").fetchone()[0]
+        if oldest is not None and version < oldest - 1:
+            return None
+        rows = connection.execute(
+            f"""
+            SELECT c.version, c.ID, c.deleted, {", ".join(f"w.{column}" for column in COLUMNS.split(", "))}
+            FROM workitem_changes c LEFT JOIN workitems w ON w.ID = c.ID
+            WHERE c.version > ?
+              AND c.version = (SELECT MAX(version) FROM workitem_changes WHERE ID = c.ID)
+            ORDER BY c.version
+            """,
+            (version,),
+        )
+        return [
+            (changed, id, None if deleted or row[0] is None else WorkItemRecord.create(*row))
+            for changed, id, deleted, *row in rows
+        ]
+
+    def sync(self):
+        """Delivers changes committed by other processes to the listeners.
+
+        If the change log was trimmed past the last version synced, the
+        missed changes can't be replayed and the resets run instead.
+        """
+        version = self.version
+        if version == self._synced_version:
+            return
+        changes = self.changes_since(self._synced_version)
+        if changes is None:
+            print(f"Work item change log no longer covers version {self._synced_version}, resetting")
+            self._synced_version = version
+            self._forget_local_versions(version)
+            for reset in self.resets:
+                reset()
+            return
+        for changed, id, item in changes:
+            with self._local_lock:
+                local = changed in self._local_versions
+            if not local:
+                for listener in self.listeners:
+                    listener(changed, id, item)
+        self._synced_version = max(version, changes[-1][0] if changes else 0)
+        self._forget_local_versions(self._synced_version)
+
+    def _forget_local_versions(self, version):
+        with self._local_lock:
+            self._local_versions = {local for local in self._local_versions if local > version}
+
+    @contextmanager
+    def bulk(self):
+        with self._transaction():
+            yield
+
+    @contextmanager
+    def _transaction(self):
+        if getattr(self._local, "writing", False):
+            yield
+            return
+        with self._write_lock:
+            self._local.writing = True
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+                try:
+                    yield
+                except BaseException:
+                    self._connection.execute("ROLLBACK")
+                    self._notifications.clear()
+                    raise
+                version = self.version
+                if version // 1000 > (version - len(self._notifications)) // 1000:
+                    self._connection.execute(
+                        "DELETE FROM workitem_changes WHERE version <= ?", (version - self.changes_retained,)
+                    )
+                self._connection.execute("COMMIT")
+            finally:
+                self._local.writing = False
+            notifications, self._notifications = self._notifications, []
+            for change in notifications:
+                with self._local_lock:
+                    self._local_versions.add(change[0])
+                for listener in self.listeners:
+                    listener(*change)
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        connection.execute("PRAGMA synchronous=FULL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def _reader(self):
+        """Returns the writer connection inside a write transaction, else this thread's reader."""
+        if getattr(self._local, "writing", False):
+            return self._connection
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            self._readers.append(connection)
+        return connection
+
+    def _insert_tags(self, item):
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO workitem_tags (tag, ID) VALUES (?, ?)",
+            ((tag, item.ID) for tag in split_tags(item.Tags)),
+        )
+
+    def _notify(self, id, item):
+        """Records the item's new version and queues the change for the listeners.
+
+        Listeners hear about it once the transaction commits.
+        """
+        version = self.version
+        if item is None:
+            self._connection.execute("DELETE FROM workitem_versions WHERE ID = ?", (id,))
+        else:
+            self._connection.execute("INSERT OR REPLACE INTO workitem_versions (ID, version) VALUES (?, ?)", (id, version))
+        self._notifications.append((version, id, item))
@@ -0,0 +1,550 @@
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager, nullcontext
+from heapq import merge
+from typing import NamedTuple
+
+INDEXED_FIELDS = ("WorkItemType", "State", "AssignedTo")
+# An item's slot packs its version above its sequence number, in one int
+SEQ_BITS = 40
+SEQ_MASK = (1 << SEQ_BITS) - 1
+
+
+class WorkItemRecord(NamedTuple):
+    """Compact immutable storage for one work item.
+
+    A tuple has no per-instance dict or validation state, and the
+    low-cardinality WorkItemType, State and AssignedTo strings are interned
+    so every record shares one copy of each value. DTOs are only built
+    from records at the API edge.
+    """
+    ID: int
+    WorkItemType: str
+    Title: str
+    AssignedTo: str
+    State: str
+    Tags: str
+
+    @classmethod
+    def create(cls, ID, WorkItemType, Title, AssignedTo, State, Tags):
+        return cls(ID, sys.intern(WorkItemType), Title, sys.intern(AssignedTo), sys.intern(State), Tags)
+
+
+def split_tags(tags):
+    """Parses a semicolon separated Tags string into a frozenset of interned tag names."""
+    if not tags:
+        return frozenset()
+    return frozenset(sys.intern(tag.strip()) for tag in tags.split(";") if tag.strip())
+
+
+class VersionConflict(Exception):
+    """Raised when a conditional write finds the item at a different version than expected."""
+
+
+class WorkItemStorage:
+    """Interface shared by the work item storage backends.
+
+    Items are WorkItemRecord tuples keyed by ID. Each item gets an insertion
+    sequence number that is never reused, `scan` yields (seq, item) in that
+    order, and every mutation bumps `version` and appears in the change log
+    read by `changes_since`. Local changes are passed to the callables in
+    `listeners` as (version, id, item), with item None for deletes. When a
+    shared backend finds that changes were missed, it calls the callables
+    in `resets` instead, so derived state can be rebuilt from a scan.
+
+    Each item also remembers the version that last wrote it. `update` and
+    `delete` accept that as `expected_version` and raise VersionConflict
+    instead of writing when the item has moved on, which gives callers
+    optimistic concurrency without holding anything between read and write.
+    Versions are only comparable within one `version_epoch`. Backends whose
+    versions restart with the process change the epoch when they do, so a
+    version remembered by a client can be recognised as foreign.
+    """
+
+    version_epoch = ""
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        return (item for _, item in self.scan())
+
+    def __contains__(self, id):
+        return self.get(id) is not None
+
+    def get(self, id):
+        raise NotImplementedError
+
+    def get_many(self, ids):
+        """Returns the item for each ID in order, with None for IDs that don't exist."""
+        return [self.get(id) for id in ids]
+
+    def get_versioned(self, id):
+        """Returns (item, version) for an item, or (None, None) if it doesn't exist."""
+        raise NotImplementedError
+
+    def add(self, item):
+        """Stores a new item; raises KeyError if the ID is taken."""
+        raise NotImplementedError
+
+    def allocate_id(self):
+        """Reserves an ID above every ID stored so far; IDs are never handed out twice."""
+        raise NotImplementedError
+
+    def update(self, id, changes, expected_version=None):
+        """Applies a dict of field changes; returns the new record or None."""
+        raise NotImplementedError
+
+    def delete(self, id, expected_version=None):
+        """Removes an item; returns the removed record or None."""
+        raise NotImplementedError
+
+    def all(self):
+        return list(self)
+
+    def snapshot(self):
+        """Returns every record in insertion order as of a single version.
+
+        Writers never modify what a snapshot references, so it can be
+        iterated without locks while writes continue.
+        """
+        raise NotImplementedError
+
+    def filter(self, tags=(), any_tags=False, **criteria):
+        """Returns items matching every given field value and the tags, in insertion order."""
+        return [item for _, item in self.scan(tags=tags, any_tags=any_tags, **criteria)]
+
+    def scan(self, after=-1, tags=(), any_tags=False, **criteria):
+        """Yields (seq, item) pairs with a sequence number above `after`, in insertion order."""
+        raise NotImplementedError
+
+    def tags(self):
+        raise NotImplementedError
+
+    def tags_of(self, id):
+        raise NotImplementedError
+
+    def values(self, field):
+        """Returns the distinct values of an indexed field present in the store."""
+        raise NotImplementedError
+
+    def counts(self, field):
+        raise NotImplementedError
+
+    def breakdown(self):
+        """Returns {(WorkItemType, State, AssignedTo): count} for every combination present."""
+        raise NotImplementedError
+
+    def changes_since(self, version):
+        """Returns (version, id, item) for every ID changed after `version`, or None if too old."""
+        raise NotImplementedError
+
+    def bulk(self):
+        """Context manager grouping many writes, e.g. while seeding from CSV."""
+        return nullcontext()
+
+    def sync(self):
+        """Delivers changes made by other processes to the listeners, if the backend is shared."""
+
+    def close(self):
+        pass
+
+
+class WorkItemStore(WorkItemStorage):
+    """In-memory work item store keyed by ID.
+
+    Records live in a dict, so lookups, updates and deletes are O(1) and
+    iteration follows insertion order. Inverted indexes over INDEXED_FIELDS
+    and tags map each value to a sorted array of the matching items'
+    sequence numbers, so a filtered page starts with a bisect at its cursor
+    and costs time proportional to the page rather than the table.
+
+    Every item also gets a monotonically increasing insertion sequence
+    number. Sequence numbers are never reused, so they make stable
+    pagination cursors even while items are created and deleted.
+
+    `version` is bumped by every mutation, so callers can cache anything
+    derived from the store and invalidate it cheaply. The last
+    `changes_retained` versions are kept in a change log, with deletes as
+    tombstones, so replicas can sync only what changed since a version.
+    Each change is also passed to the callables in `listeners` as
+    (version, id, item), with item None for deletes.
+
+    Counts per combination of INDEXED_FIELDS values are maintained on every
+    write and drop to zero on delete, so aggregate statistics and the lists
+    of values in use never drift from the data.
+
+    Per-ID bookkeeping is kept small: one int per item packs its sequence
+    number and version, the insertion order and change log live in arrays,
+    and items without tags have no tag set entry.
+
+    Writers are serialized by a lock and replace immutable records instead
+    of modifying them. Structures that readers walk are either swapped
+    whole or only appended to, so readers take no locks. `snapshot` copies
+    the record dict in one atomic step and caches the tuple for the
+    version it was taken at. `_writes` acts as a seqlock (odd while a write
+    is in progress) to tell whether that version label can be trusted.
+    Index arrays are edited in place, so readers copy them a slice at a
+    time and find the next slice by bisecting again. Filtered scans check
+    each record against the criteria, so an index caught mid-update never
+    yields a record that does not match.
+    """
+
+    def __init__(self, changes_retained=100000):
+        self._items = {}
+        # id -> version << SEQ_BITS | seq
+        self._slots = {}
+        self._next_seq = 0
+        self._next_id = 1
+        # (seqs, ids): parallel arrays in insertion order. Deletes leave a
+        # None tombstone; compaction swaps in a new pair.
+        self._order = (array("q"), [])
+        self._tombstones = 0
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        self._tags = {}
+        self._tag_sets = {}
+        self._counts = {}
+        self.version = 0
+        # Versions are renumbered when the store is rebuilt at startup
+        self.version_epoch = format(time.time_ns(), "x")
+        self.changes_retained = changes_retained
+        # (first version, changed IDs, whether each change was a delete);
+        # trimming swaps in a new triple
+        self._change_log = (1, array("q"), bytearray())
+        self.listeners = []
+        self.resets = []
+        self._write_lock = threading.Lock()
+        self._writes = 0
+        self._snapshot = (None, ())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __contains__(self, id):
+        return id in self._items
+
+    def get(self, id):
+        return self._items.get(id)
+
+    def get_many(self, ids):
+        items = self._items
+        return [items.get(id) for id in ids]
+
+    def get_versioned(self, id):
+        # Writers store the record before its version, so reading the
+        # version first can't pair a new version with an older record
+        slot = self._slots.get(id)
+        item = self._items.get(id)
+        if item is None or slot is None:
+            return None, None
+        return item, slot >> SEQ_BITS
+
+    def add(self, item):
+        with self._writing():
+            if item.ID in self._items:
+                raise KeyError(item.ID)
+            seqs, ids = self._order
+            seq = self._next_seq
+            self._slots[item.ID] = (self.version + 1) << SEQ_BITS | seq
+            # IDs are appended before their seqs, so a lock-free reader that
+            # found a seq always finds the ID at the same position
+            ids.append(item.ID)
+            seqs.append(seq)
+            self._items[item.ID] = item
+            self._next_seq += 1
+            self._next_id = max(self._next_id, item.ID + 1)
+            self._index(item, seq)
+            self._record_change(item.ID, False)
+        return item
+
+    def allocate_id(self):
+        with self._write_lock:
+            id = self._next_id
+            self._next_id += 1
+        return id
+
+    def update(self, id, changes, expected_version=None):
+        """Replaces an item with a copy carrying the given field changes and reindexes it."""
+        with self._writing():
+            item = self._items.get(id)
+            if item is None:
+                return None
+            self._check_version(id, expected_version)
+            old, item = item, WorkItemRecord.create(**{**item._asdict(), **changes})
+            self._items[id] = item
+            self._reindex(old, item, self._slots[id] & SEQ_MASK)
+            self._record_change(id, False)
+        return item
+
+    def delete(self, id, expected_version=None):
+        with self._writing():
+            if id not in self._items:
+                return None
+            self._check_version(id, expected_version)
+            item = self._items.pop(id)
+            seqs, ids = self._order
+            seq = self._slots.pop(id) & SEQ_MASK
+            ids[bisect_right(seqs, seq) - 1] = None
+            self._tombstones += 1
+            if self._tombstones > 1024 and self._tombstones * 2 > len(ids):
+                self._compact()
+            self._unindex(item, seq)
+            self._record_change(id, True)
+        return item
+
+    def all(self):
+        return list(self.snapshot())
+
+    def snapshot(self):
+        version, items = self._snapshot
+        if version == self.version:
+            return items
+        writes = self._writes
+        version = self.version
+        items = tuple(self._items.copy().values())
+        if writes % 2 == 0 and writes == self._writes:
+            self._snapshot = (version, items)
+        return items
+
+    def tags(self):
+        return list(self._tags)
+
+    def values(self, field):
+        return list(self._indexes[field])
+
+    def counts(self, field):
+        return {value: len(seqs) for value, seqs in self._indexes[field].copy().items()}
+
+    def breakdown(self):
+        return self._counts.copy()
+
+    def tags_of(self, id):
+        """Returns the parsed tag set of an item, parsed once when it was written."""
+        return self._tag_sets.get(id, frozenset())
+
+    def scan(self, after=-1, tags=(), any_tags=False, **criteria):
+        """Yields (seq, item) pairs with a sequence number above `after`, in insertion order.
+
+        Items must carry all of `tags`, or any of them when `any_tags` is
+        set. Filtered scans walk the smallest matching index from `after`
+        and stop as soon as the caller does, so a page costs time
+        proportional to the page rather than to the whole match set.
+        """
+        criteria = {field: value for field, value in criteria.items() if value is not None}
+        if not criteria and not tags:
+            seqs, ids = self._order
+            for position in range(bisect_right(seqs, after), min(len(seqs), len(ids))):
+                id = ids[position]
+                item = self._items.get(id)
+                if item is not None and self._slots.get(id, -1) & SEQ_MASK == seqs[position]:
+                    yield seqs[position], item
+            return
+        indexes = [self._indexes[field].get(value) for field, value in criteria.items()]
+        if tags and not any_tags:
+            indexes.extend(self._tags.get(tag) for tag in tags)
+        if None in indexes:
+            return
+        if len(indexes) > 1:
+            candidates = _intersection(sorted(indexes, key=len), after)
+        elif indexes:
+            candidates = _seqs_after(indexes[0], after)
+        else:
+            candidates = _distinct(merge(*(_seqs_after(self._tags.get(tag, ()), after) for tag in tags)))
+        wanted = set(tags)
+        for seq in candidates:
+            item = self._item_at(seq)
+            if item is None or any(getattr(item, field) != value for field, value in criteria.items()):
+                continue
+            if wanted:
+                tag_set = self.tags_of(item.ID)
+                matched = not wanted.isdisjoint(tag_set) if any_tags else wanted <= tag_set
+                if not matched:
+                    continue
+            yield seq, item
+
+    def changes_since(self, version):
+        """Returns (version, id, item) for every ID changed after `version`.
+
+        Each ID appears once with its latest change, in version order; item
+        is None for deletes. Returns None when `version` is older than the
+        retained change log and the caller has to resync in full.
+        """
+        start, ids, deletes = self._change_log
+        if version < start - 1:
+            return None
+        latest = {}
+        # IDs are appended before their delete flags, so the flags bound what is complete
+        for offset in range(max(version - start + 1, 0), len(deletes)):
+            id = ids[offset]
+            latest.pop(id, None)
+            latest[id] = (start + offset, deletes[offset])
+        result = []
+        for id, (changed, deleted) in latest.items():
+            item = None if deleted else self._items.get(id)
+            if deleted or item is not None:
+                result.append((changed, id, item))
+        return result
+
+    def _item_at(self, seq):
+        seqs, ids = self._order
+        position = bisect_left(seqs, seq)
+        if position >= min(len(seqs), len(ids)) or seqs[position] != seq:
+            return None
+        id = ids[position]
+        item = self._items.get(id)
+        return item if item is not None and self._slots.get(id, -1) & SEQ_MASK == seq else None
+
+    @contextmanager
+    def _writing(self):
+        with self._write_lock:
+            self._writes += 1
+            try:
+                yield
+            finally:
+                self._writes += 1
+
+    def _check_version(self, id, expected_version):
+        if expected_version is not None and self._slots.get(id, 0) >> SEQ_BITS != expected_version:
+            raise VersionConflict(id)
+
+    def _record_change(self, id, deleted):
+        self.version += 1
+        if not deleted:
+            self._slots[id] = self.version << SEQ_BITS | self._slots[id] & SEQ_MASK
+        start, ids, deletes = self._change_log
+        ids.append(id)
+        deletes.append(deleted)
+        for listener in self.listeners:
+            listener(self.version, id, None if deleted else self._items[id])
+        if len(deletes) > 2 * self.changes_retained:
+            dropped = len(deletes) - self.changes_retained
+            self._change_log = (start + dropped, ids[dropped:], deletes[dropped:])
+
+    def _compact(self):
+        live = [(seq, id) for seq, id in zip(*self._order) if id is not None]
+        self._order = (array("q", [seq for seq, _ in live]), [id for _, id in live])
+        self._tombstones = 0
+
+    def _index(self, item, seq):
+        key = tuple(getattr(item, field) for field in INDEXED_FIELDS)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        for field, index in self._indexes.items():
+            _insert(index, getattr(item, field), seq)
+        tags = split_tags(item.Tags)
+        if tags:
+            self._tag_sets[item.ID] = tags
+        for tag in tags:
+            _insert(self._tags, tag, seq)
+
+    def _unindex(self, item, seq):
+        key = tuple(getattr(item, field) for field in INDEXED_FIELDS)
+        if self._counts[key] == 1:
+            del self._counts[key]
+        else:
+            self._counts[key] -= 1
+        for field, index in self._indexes.items():
+            _remove(index, getattr(item, field), seq)
+        for tag in self._tag_sets.pop(item.ID, ()):
+            _remove(self._tags, tag, seq)
+
+    def _reindex(self, old, new, seq):
+        """Moves an updated item between index entries, touching only the values that changed."""
+        old_key = tuple(getattr(old, field) for field in INDEXED_FIELDS)
+        new_key = tuple(getattr(new, field) for field in INDEXED_FIELDS)
+        if old_key != new_key:
+            if self._counts[old_key] == 1:
+                del self._counts[old_key]
+            else:
+                self._counts[old_key] -= 1
+            self._counts[new_key] = self._counts.get(new_key, 0) + 1
+            for field, old_value, new_value in zip(INDEXED_FIELDS, old_key, new_key):
+                if old_value != new_value:
+                    _insert(self._indexes[field], new_value, seq)
+                    _remove(self._indexes[field], old_value, seq)
+        if old.Tags != new.Tags:
+            old_tags = self._tag_sets.get(new.ID, frozenset())
+            new_tags = split_tags(new.Tags)
+            if new_tags:
+                self._tag_sets[new.ID] = new_tags
+            else:
+                self._tag_sets.pop(new.ID, None)
+            for tag in new_tags - old_tags:
+                _insert(self._tags, tag, seq)
+            for tag in old_tags - new_tags:
+                _remove(self._tags, tag, seq)
+
+
+def _insert(index, key, seq):
+    seqs = index.get(key)
+    if seqs is None:
+        index[key] = array("q", (seq,))
+    elif seqs[-1] < seq:
+        seqs.append(seq)
+    else:
+        seqs.insert(bisect_left(seqs, seq), seq)
+
+
+def _remove(index, key, seq):
+    seqs = index.get(key)
+    if seqs is None:
+        return
+    position = bisect_left(seqs, seq)
+    if position < len(seqs) and seqs[position] == seq:
+        del seqs[position]
+        if not seqs:
+            del index[key]
+
+
+def _seqs_after(seqs, after, chunk=256):
+    """Yields the values above `after` in a sorted index array, in order.
+
+    The array is copied a slice at a time and the next slice is found by
+    bisecting for the last value yielded, so writers inserting or removing
+    elsewhere in the array in between never cause a skip or a repeat.
+    """
+    while True:
+        start = bisect_right(seqs, after)
+        block = seqs[start:start + chunk]
+        if not block:
+            return
+        yield from block
+        after = block[-1]
+
+
+def _intersection(indexes, after):
+    """Yields the values above `after` present in every sorted index array, in order.
+
+    Each array is entered by bisecting for the current candidate and the
+    candidate jumps to the first value an array has past it, so runs that
+    only some arrays contain are skipped rather than walked.
+    """
+    smallest, others = indexes[0], indexes[1:]
+    while True:
+        position = bisect_right(smallest, after)
+        if position == len(smallest):
+            return
+        seq = smallest[position]
+        for seqs in others:
+            position = bisect_left(seqs, seq)
+            if position == len(seqs):
+                return
+            if seqs[position] != seq:
+                after = seqs[position] - 1
+                break
+        else:
+            yield seq
+            after = seq
+
+
+def _distinct(seqs):
+    previous = None
+    for seq in seqs:
+        if seq != previous:
+            yield seq
+            previous = seq